@@ -0,0 +1,92 @@
+"""Throughput of file hashing, in GB/s, against the former 4 KB read loop
+of check_md5
+
+    python benchmarks/bench_hashing.py --size-mb 1024 --files 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, path)
+
+from registry.hashing import HashCache, hash_file, hash_files  # noqa: E402
+
+
+def legacy_check_md5(path):
+    m = hashlib.md5()
+    with open(path, 'rb') as fobj:
+        while True:
+            data = fobj.read(4096)
+            if not data:
+                break
+            m.update(data)
+    return m.hexdigest()
+
+
+def measure(name, func, nbytes, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    result = {"case": name, "seconds": best,
+              "gb_per_s": nbytes / best / 1e9}
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256,
+                        help="size of each file")
+    parser.add_argument("--files", type=int, default=4,
+                        help="number of files hashed in parallel")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(tmpdir, "f%d" % i))
+            with open(paths[-1], "wb") as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(1024 * 1024))
+        size = args.size_mb * 1024 * 1024
+        total = size * args.files
+        assert legacy_check_md5(paths[0]) == hash_file(paths[0])["md5"]
+
+        results = [
+            measure("legacy check_md5 (md5, 4 KB reads)",
+                    lambda: legacy_check_md5(paths[0]), size, args.repeat),
+            measure("hash_file md5",
+                    lambda: hash_file(paths[0], ["md5"]), size, args.repeat),
+            measure("hash_file md5+sha256",
+                    lambda: hash_file(paths[0]), size, args.repeat),
+            measure("hash_file md5+sha256 mmap",
+                    lambda: hash_file(paths[0], use_mmap=True), size,
+                    args.repeat),
+            measure("legacy check_md5 x %d files serial" % args.files,
+                    lambda: [legacy_check_md5(p) for p in paths], total,
+                    args.repeat),
+            measure("hash_files md5+sha256 x %d files" % args.files,
+                    lambda: hash_files(paths), total, args.repeat),
+        ]
+        cache = HashCache()
+        hash_files(paths, cache=cache)
+        results.append(measure("hash_files cached x %d files" % args.files,
+                               lambda: hash_files(paths, cache=cache), total,
+                               args.repeat))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Time of `import registry` in a fresh interpreter, from
+`python -X importtime`, and whether dflow gets imported with it
+
+    python benchmarks/bench_import.py --repeat 5 --max-ms 300
+
+Exits with status 1 if dflow is imported or, with --max-ms, if the
+median import time exceeds it.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+importtime_re = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(statement):
+    """Cumulative import time in microseconds of each top-level module
+    imported by statement"""
+    env = dict(os.environ, PYTHONPATH=path)
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                       env=env, stderr=subprocess.PIPE,
+                       stdout=subprocess.DEVNULL, universal_newlines=True,
+                       check=True)
+    modules = {}
+    for line in p.stderr.splitlines():
+        m = importtime_re.match(line)
+        if m is not None:
+            modules[m.group(4).strip()] = int(m.group(2))
+    return modules
+
+
+def measure(name, statement, module, repeat):
+    times = []
+    for _ in range(repeat):
+        modules = import_times(statement)
+        times.append(modules.get(module, 0) / 1000)
+    result = {"case": name, "ms": statistics.median(times),
+              "min_ms": min(times), "dflow": "dflow" in modules,
+              "modules": len(modules)}
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float,
+                        help="fail if import registry takes longer")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        measure("import registry", "import registry", "registry",
+                args.repeat),
+        measure("import dflow", "import dflow", "dflow", args.repeat),
+    ]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if results[0]["dflow"]:
+        sys.exit("import registry imports dflow")
+    if args.max_ms is not None and results[0]["ms"] > args.max_ms:
+        sys.exit("import registry takes %.1f ms, more than %.1f ms"
+                 % (results[0]["ms"], args.max_ms))
+
+
+if __name__ == "__main__":
+    main()
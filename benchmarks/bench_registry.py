@@ -0,0 +1,260 @@
+"""Insert and query throughput, latency percentiles, serialization cost and
+peak memory of the entities against a local stand-in registry, across
+catalog sizes and concurrency levels
+
+    python benchmarks/bench_registry.py --catalog 100 1000 \
+        --concurrency 1 8 32 --latency-ms 5 --output results.json
+
+Bytes on the wire are reported with request_mb and response_mb, e.g. for
+comparing --compression none and gzip with --readme-bytes 20000.
+
+Each result is printed as a JSON line, and all of them written to --output
+so that runs can be compared before a release.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, path)
+
+import registry.model  # noqa: E402
+from registry.artifacts import (GitArtifact, HTTPArtifact,  # noqa: E402
+                                LocalPath)
+from registry.client import RegistryClient  # noqa: E402
+from registry.model import (OP, Dataset, Model, Resolver,  # noqa: E402
+                            Workflow, projection)
+from registry.wire import WireFormat  # noqa: E402
+
+from fake_registry import FakeRegistry, FakeUploader  # noqa: E402
+
+NAMESPACE = "bench"
+# fields of listing screens
+LISTING_FIELDS = ["namespace", "name", "version"]
+
+
+def make_readme(cls, i, size):
+    readme = "# %s\n" % cls.__name__ * 4
+    line = "Trained on dataset %d with lr=0.001 for 100000 steps.\n" % i
+    return readme + line * (size // len(line))
+
+
+def make_entities(cls, n, local_path, datasets=(), readme_bytes=0):
+    entities = []
+    for i in range(n):
+        kwargs = {"description": "%s %d" % (cls.__name__, i),
+                  "readme": make_readme(cls, i, readme_bytes),
+                  "author": "someone",
+                  "labels": {"task": "qsar", "framework": "deepmd"},
+                  "status": "ready"}
+        if cls in (Model, Dataset):
+            kwargs.update(
+                location={"data": LocalPath(local_path),
+                          "log": HTTPArtifact("https://host/%d/log.txt" % i)},
+                code=GitArtifact("https://host/repo.git", "%040x" % i),
+                parameters={"lr": 0.001, "steps": 100000},
+                spec={"type": "se_e2_a", "rcut": 6.0})
+            if datasets:
+                kwargs["source"] = [datasets[i % len(datasets)]]
+        else:
+            kwargs.update(code={"repo": "https://host/repo.git"},
+                          python_package="package==1.0",
+                          docker_image="registry/image:1.0")
+        entities.append(cls(NAMESPACE, "%s-%d" % (cls.__name__.lower(),
+                                                  i % 100),
+                            "v1.0.%d" % i, **kwargs))
+    return entities
+
+
+def percentile(latencies, q):
+    return latencies[int(round(q * (len(latencies) - 1)))]
+
+
+def run(func, args, concurrency):
+    """Call func with each of args on concurrency threads, returning the
+    elapsed time and the sorted latencies"""
+    def timed(arg):
+        start = time.perf_counter()
+        func(arg)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed, args))
+    return time.perf_counter() - start, latencies
+
+
+def peak_memory(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(results, case, cls, catalog, concurrency, ops, elapsed,
+           latencies=None, peak=None, **extra):
+    result = {"case": case, "entity": cls.__name__, "catalog": catalog,
+              "concurrency": concurrency, "ops": ops, "seconds": elapsed,
+              "ops_per_s": ops / elapsed}
+    if latencies:
+        result["p50_ms"] = percentile(latencies, 0.5) * 1000
+        result["p99_ms"] = percentile(latencies, 0.99) * 1000
+    if peak is not None:
+        result["peak_mb"] = peak / 1024 / 1024
+    result.update(extra)
+    print(json.dumps(result))
+    results.append(result)
+
+
+def decode(cls, records, fields=None):
+    if cls in (Model, Dataset):
+        # references left unresolved, only decoding is measured
+        return Resolver(lazy=True).load(cls, records,
+                                        projection(cls, fields))
+    return cls.from_dict_list(records)
+
+
+def bench_serialization(results, cls, records):
+    entities = decode(cls, records)
+    n = len(entities)
+    start = time.perf_counter()
+    for entity in entities:
+        entity.to_dict()
+    report(results, "to_dict", cls, n, 1, n, time.perf_counter() - start)
+    start = time.perf_counter()
+    decode(cls, records)
+    report(results, "decode", cls, n, 1, n,
+           time.perf_counter() - start)
+    if cls in (Model, Dataset):
+        start = time.perf_counter()
+        decode(cls, records, LISTING_FIELDS)
+        report(results, "decode projection", cls, n, 1, n,
+               time.perf_counter() - start)
+
+
+def bench_catalog(results, server, cls, n, concurrency, queries, local_path,
+                  datasets=(), wire=None, readme_bytes=0):
+    client = RegistryClient(server.url, pool_maxsize=max(concurrency, 10),
+                            wire=wire)
+    entities = make_entities(cls, n, local_path, datasets, readme_bytes)
+
+    received = server.bytes_received
+    elapsed, latencies = run(lambda e: e.insert(client=client), entities,
+                             concurrency)
+    report(results, "insert", cls, n, concurrency, n, elapsed, latencies,
+           request_mb=(server.bytes_received - received) / 1024 / 1024)
+
+    ids = [entities[i * n // queries].id for i in range(min(queries, n))]
+    elapsed, latencies = run(lambda id: cls.query(id=id, client=client), ids,
+                             concurrency)
+    report(results, "query id", cls, n, concurrency, len(ids), elapsed,
+           latencies)
+
+    # the same lookups at once, by concurrent GETs then by batches
+    for case, batch_size in [("query many", None),
+                             ("query many batched", 100)]:
+        client.query_batch_size = batch_size
+        requests = server.requests["GET"]
+        start = time.perf_counter()
+        cls.query_many(ids=ids, client=client, concurrency=concurrency)
+        report(results, case, cls, n, concurrency, len(ids),
+               time.perf_counter() - start,
+               requests=server.requests["GET"] - requests)
+    client.query_batch_size = None
+
+    def listing(_=None):
+        return cls.query(namespace=NAMESPACE, client=client)
+
+    def streamed(_=None):
+        for _ in cls.query(namespace=NAMESPACE, client=client, stream=True):
+            pass
+
+    def projected(_=None):
+        return cls.query(namespace=NAMESPACE, client=client,
+                         fields=LISTING_FIELDS)
+
+    requests, sent = server.requests["GET"], server.bytes_sent
+    elapsed, latencies = run(listing, range(concurrency), concurrency)
+    requests, sent = server.requests["GET"] - requests, \
+        server.bytes_sent - sent
+    report(results, "query listing", cls, n, concurrency, n * concurrency,
+           elapsed, latencies, peak_memory(listing), requests=requests,
+           response_mb=sent / 1024 / 1024)
+    if cls in (Model, Dataset):
+        sent = server.bytes_sent
+        elapsed, latencies = run(projected, range(concurrency), concurrency)
+        sent = server.bytes_sent - sent
+        report(results, "query projection", cls, n, concurrency,
+               n * concurrency, elapsed, latencies, peak_memory(projected),
+               response_mb=sent / 1024 / 1024)
+    elapsed, latencies = run(streamed, range(concurrency), concurrency)
+    report(results, "query stream", cls, n, concurrency, n * concurrency,
+           elapsed, latencies, peak_memory(streamed))
+    client.close()
+    return entities
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", type=int, nargs="+", default=[100, 1000],
+                        help="numbers of entities registered per class")
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 8, 32])
+    parser.add_argument("--latency-ms", type=float, default=5.0,
+                        help="latency injected per request")
+    parser.add_argument("--upload-latency-ms", type=float, default=0.0,
+                        help="latency injected per upload")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="number of queries by id per case")
+    parser.add_argument("--compression", default="none",
+                        choices=["none", "gzip", "zstd"],
+                        help="compression of the request bodies")
+    parser.add_argument("--readme-bytes", type=int, default=0,
+                        help="size of the readme of each entity")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+    compression = None if args.compression == "none" else args.compression
+
+    # local artifacts are "uploaded" by the stand-in of upload_artifact
+    registry.model.upload_artifact = FakeUploader(args.upload_latency_ms
+                                                  / 1000)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            FakeRegistry(latency=args.latency_ms / 1000) as server:
+        local_path = os.path.join(tmpdir, "data.txt")
+        with open(local_path, "w") as f:
+            f.write("data")
+        for n in args.catalog:
+            for concurrency in args.concurrency:
+                server.reset()
+                options = {"wire": WireFormat(compression),
+                           "readme_bytes": args.readme_bytes}
+                datasets = bench_catalog(results, server, Dataset, n,
+                                         concurrency, args.queries,
+                                         local_path, **options)
+                # models derived from the datasets, resolved by queries
+                bench_catalog(results, server, Model, n, concurrency,
+                              args.queries, local_path, datasets[:10],
+                              **options)
+                for cls in [Workflow, OP]:
+                    bench_catalog(results, server, cls, n, concurrency,
+                                  args.queries, local_path, **options)
+            for cls in [Model, Dataset, Workflow, OP]:
+                bench_serialization(results, cls,
+                                    server.records[cls._endpoint])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
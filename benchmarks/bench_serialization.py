@@ -0,0 +1,257 @@
+"""Records per second encoded and decoded by the compiled codecs, against
+the former reflective to_dict/from_dict
+
+    python benchmarks/bench_serialization.py --records 10000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, path)
+
+from dflow import S3Artifact  # noqa: E402
+
+from registry.artifacts import Artifact  # noqa: E402
+from registry.model import (Dataset, Model, Resolver,  # noqa: E402
+                            Workflow, artifact_fields)
+from registry.utils import json_dumps, json_loads, orjson  # noqa: E402
+
+
+class LegacyModel:
+    # looked up by Resolver for the references to prefetch
+    _artifact_fields = tuple(artifact_fields)
+
+    def __init__(self, namespace, name, version, description=None,
+                 readme=None, author=None, labels=None, status=None,
+                 size=None, id=None, location=None, code=None, source=None,
+                 parameters=None, spec=None, resources=None, **kwargs):
+        self.namespace = namespace
+        self.name = name
+        self.description = description
+        self.readme = readme
+        self.author = author
+        self.version = version
+        self.labels = labels
+        self.status = status
+        self.size = size
+        self.location = location
+        self.code = code
+        self.source = source
+        self.parameters = parameters
+        self.spec = spec
+        self.resources = resources
+        self.id = id
+
+    def to_dict(self):
+        d = {}
+        for key, value in self.__dict__.items():
+            if key in ["location", "code", "source", "resources"]:
+                if value is None:
+                    d[key] = None
+                elif isinstance(value, (Artifact, S3Artifact, Model, Dataset,
+                                        LegacyModel)):
+                    d[key] = legacy_obj_to_dict(value)
+                elif isinstance(value, dict):
+                    d[key] = {"dict": {k: legacy_obj_to_dict(v)
+                                       for k, v in value.items()}}
+                elif isinstance(value, list):
+                    d[key] = {"list": [legacy_obj_to_dict(i) for i in value]}
+                else:
+                    raise TypeError("%s is not supported artifact"
+                                    % type(value))
+            else:
+                d[key] = value
+        return d
+
+
+class LegacyResolver(Resolver):
+    """Resolver building objects as before the compiled codecs, which had
+    no projections: fields is accepted for the signature of Resolver.build
+    only, the benchmark always loading whole records"""
+
+    def build(self, cls, record, fields=None):
+        key = None
+        if record.get("id") is not None:
+            key = (cls, str(record["id"]))
+            if key in self.objects:
+                return self.objects[key]
+        obj = cls(**{k: v for k, v in record.items()
+                     if k not in artifact_fields})
+        if key is not None:
+            self.objects[key] = obj
+        for k in artifact_fields:
+            if k in record:
+                setattr(obj, k, self.decode(record[k]))
+        return obj
+
+    def decode(self, value):
+        if not value:
+            return None
+        elif "dict" in value:
+            return {k: legacy_obj_from_dict(v, self)
+                    for k, v in value["dict"].items()}
+        elif "list" in value:
+            return [legacy_obj_from_dict(i, self) for i in value["list"]]
+        else:
+            return legacy_obj_from_dict(value, self)
+
+
+class LegacyWorkflow:
+    def __init__(self, namespace, name, version, description=None,
+                 readme=None, author=None, labels=None, status=None,
+                 code=None, python_package=None, docker_image=None, id=None):
+        self.namespace = namespace
+        self.name = name
+        self.description = description
+        self.readme = readme
+        self.author = author
+        self.version = version
+        self.labels = labels
+        self.status = status
+        self.code = code
+        self.python_package = python_package
+        self.docker_image = docker_image
+        self.id = id
+
+    @classmethod
+    def from_dict_list(cls, lis):
+        res = []
+        for wf in lis:
+            try:
+                name = wf["name"]
+                namespace = wf["namespace"]
+                version = wf["version"]
+            except KeyError:
+                continue
+            w = cls(namespace, name, version)
+            for k in wf:
+                w.__setattr__(k, wf[k])
+            res.append(w)
+        return res
+
+    def to_dict(self):
+        d = self.__dict__
+        return {key: d[key] for key in d
+                if "__" not in key and key is not None}
+
+
+def legacy_obj_from_dict(d, resolver):
+    if "model" in d:
+        return resolver.lookup(Model, d["model"]["id"])
+    if "dataset" in d:
+        return resolver.lookup(Dataset, d["dataset"]["id"])
+    else:
+        return Artifact.from_dict(d)
+
+
+def legacy_obj_to_dict(obj):
+    if isinstance(obj, Artifact):
+        return obj.to_dict()
+    elif isinstance(obj, S3Artifact):
+        return {"s3": obj.to_dict()}
+
+
+def make_records(n):
+    records = []
+    for i in range(n):
+        records.append({
+            "id": str(i), "namespace": "ns", "name": "model-%d" % (i % 100),
+            "version": "v1.0.%d" % i, "description": "model %d" % i,
+            "readme": "# model\n" * 4, "author": "someone",
+            "labels": {"task": "qsar", "framework": "deepmd"},
+            "status": "ready", "size": 1024 * i,
+            "location": {"dict": {
+                "model": {"http": {"url": "https://host/%d/model.pb" % i}},
+                "log": {"http": {"url": "https://host/%d/log.txt" % i}}}},
+            "code": {"git": {"repo": "https://host/repo.git",
+                             "revision": "%040x" % i}},
+            "source": {"list": [{"http": {"url": "https://host/data/%d" % j}}
+                                for j in range(3)]},
+            "parameters": {"lr": 0.001, "steps": 100000},
+            "spec": {"type": "se_e2_a", "rcut": 6.0},
+            "resources": None})
+    return records
+
+
+def measure(name, func, n, repeat):
+    best = None
+    for _ in range(repeat):
+        # collections of the other records would dominate, as in timeit
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    result = {"case": name, "seconds": best, "records_per_s": n / best}
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    n = args.records
+    records = make_records(n)
+    wf_records = [{k: r[k] for k in ["id", "namespace", "name", "version",
+                                     "description", "labels", "status"]}
+                  for r in records]
+    legacy = LegacyResolver().load(LegacyModel, records)
+    models = Resolver().load(Model, records)
+    assert [m.to_dict() for m in models] == [m.to_dict() for m in legacy]
+    legacy_wfs = LegacyWorkflow.from_dict_list(wf_records)
+    wfs = Workflow.from_dict_list(wf_records)
+    assert [w.to_dict() for w in wfs] == [w.to_dict() for w in legacy_wfs]
+    page = {"code": 0, "data": {"models": records}}
+    body = json.dumps(page).encode()
+
+    results = [
+        measure("legacy Model.from_dict_list",
+                lambda: LegacyResolver().load(LegacyModel, records), n,
+                args.repeat),
+        measure("Model.from_dict_list",
+                lambda: Resolver().load(Model, records), n, args.repeat),
+        measure("legacy Model.to_dict",
+                lambda: [m.to_dict() for m in legacy], n, args.repeat),
+        measure("Model.to_dict",
+                lambda: [m.to_dict() for m in models], n, args.repeat),
+        measure("legacy Workflow.from_dict_list",
+                lambda: LegacyWorkflow.from_dict_list(wf_records), n,
+                args.repeat),
+        measure("Workflow.from_dict_list",
+                lambda: Workflow.from_dict_list(wf_records), n, args.repeat),
+        measure("legacy Workflow.to_dict",
+                lambda: [w.to_dict() for w in legacy_wfs], n, args.repeat),
+        measure("Workflow.to_dict",
+                lambda: [w.to_dict() for w in wfs], n, args.repeat),
+        measure("json.loads page", lambda: json.loads(body), n, args.repeat),
+        measure("json_loads page (%s)" % ("orjson" if orjson else "json"),
+                lambda: json_loads(body), n, args.repeat),
+        measure("json.dumps page", lambda: json.dumps(page), n, args.repeat),
+        measure("json_dumps page (%s)" % ("orjson" if orjson else "json"),
+                lambda: json_dumps(page), n, args.repeat),
+        measure("legacy decode page (json + from_dict_list)",
+                lambda: LegacyResolver().load(LegacyModel, json.loads(body)[
+                    "data"]["models"]), n, args.repeat),
+        measure("decode page (json_loads + from_dict_list)",
+                lambda: Resolver().load(Model, json_loads(body)["data"][
+                    "models"]), n, args.repeat),
+    ]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Local stand-in of the registry for the benchmarks and the tests, serving
+/api/v1/model, /api/v1/data, /api/v1/workflow and /api/v1/OP from memory
+with an injected latency, and a stand-in of upload_artifact
+
+    python benchmarks/fake_registry.py --port 8080 --latency-ms 5
+"""
+import argparse
+import fnmatch
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, path)
+
+from dflow import S3Artifact  # noqa: E402
+
+from registry.utils import version_key  # noqa: E402
+from registry.wire import (DEFAULT_COMPRESS_THRESHOLD, MSGPACK,  # noqa: E402
+                           compress, decompress, msgpack)
+
+list_keys = {"/api/v1/model": "models", "/api/v1/data": "data",
+             "/api/v1/workflow": "workflows", "/api/v1/OP": "OPs"}
+query_keys = ["namespace", "name", "version"]
+
+
+class FakeRegistry:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, reject_encoded: int = None,
+                 unique: bool = False) -> None:
+        """
+        Registry serving the entities from memory
+
+        Args:
+            host: host to listen on
+            port: port to listen on, any free port by default
+            latency: seconds waited before answering each request
+            reject_encoded: status answering the compressed or MessagePack
+                request bodies, as a registry not decoding them, with a
+                body that is not a response of the registry
+            unique: answer 400 with code 1 the registration (but by batch)
+                of a version registered already
+
+        Queries filter by id, by comma-separated ids, and by namespace,
+        name and version with wildcards or version=latest, paged by page
+        and page_size, and only return the comma-separated fields if any.
+        Entities are registered by POST to an endpoint, or to
+        <endpoint>/batch with a list of entities. Request bodies may be
+        gzip or zstd encoded, and in MessagePack; responses are gzipped and
+        in MessagePack if accepted (and msgpack installed). Query responses
+        carry an ETag, and are answered 304 Not Modified when the request
+        holds it in If-None-Match.
+        """
+        self.records = {path: [] for path in list_keys}
+        self.requests = {"GET": 0, "POST": 0}
+        self.latency = latency
+        self.reject_encoded = reject_encoded
+        self.unique = unique
+        # (Content-Encoding, Content-Type) of the bodies posted
+        self.posted = []
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def __repr__(self):
+        return "<FakeRegistry %s>" % self.url
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    def start(self) -> "FakeRegistry":
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self) -> None:
+        with self.lock:
+            for records in self.records.values():
+                records.clear()
+            self.requests = {"GET": 0, "POST": 0}
+            self.posted = []
+            self.not_modified = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+    def count(self, method: str) -> None:
+        with self.lock:
+            self.requests[method] += 1
+        time.sleep(self.latency)
+
+    def add(self, path: str, record: dict) -> str:
+        """Register a record, returning its id, None if its version is
+        registered already and unique is set"""
+        with self.lock:
+            if self.unique and any(
+                    all(r.get(k) == record.get(k) for k in query_keys)
+                    for r in self.records[path]):
+                return None
+            record["id"] = str(next(self.ids))
+            self.records[path].append(record)
+        return record["id"]
+
+    def find(self, path: str, params: dict) -> list:
+        if params.get("id"):
+            return [r for r in self.records[path]
+                    if r.get("id") == params["id"]]
+        if params.get("ids"):
+            ids = set(params["ids"].split(","))
+            return [r for r in self.records[path] if r.get("id") in ids]
+        records = self.records[path]
+        for k in query_keys:
+            if params.get(k) and params[k] != "latest":
+                records = [r for r in records
+                           if fnmatch.fnmatchcase(r.get(k) or "", params[k])]
+        if params.get("version") == "latest":
+            latest = {}
+            for r in records:
+                key = (r.get("namespace"), r.get("name"))
+                if key not in latest or version_key(r.get("version") or "") \
+                        > version_key(latest[key].get("version") or ""):
+                    latest[key] = r
+            records = list(latest.values())
+        if params.get("page_size"):
+            size = int(params["page_size"])
+            page = int(params.get("page") or 1)
+            records = records[(page - 1) * size:page * size]
+        if params.get("fields"):
+            fields = params["fields"].split(",")
+            records = [{k: r[k] for k in fields if k in r} for r in records]
+        return records
+
+    def handler(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # kept-alive connections would otherwise wait for delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, body: dict, status: int = 200, etag: str = None):
+                if msgpack is not None and \
+                        MSGPACK in self.headers.get("Accept", ""):
+                    content_type = MSGPACK
+                    data = msgpack.packb(body, use_bin_type=True)
+                else:
+                    content_type = "application/json"
+                    data = json.dumps(body).encode()
+                encoding = None
+                if "gzip" in self.headers.get("Accept-Encoding", "") and \
+                        len(data) >= DEFAULT_COMPRESS_THRESHOLD:
+                    encoding = "gzip"
+                    data = compress(data, encoding)
+                with registry.lock:
+                    registry.bytes_sent += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                if encoding is not None:
+                    self.send_header("Content-Encoding", encoding)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                registry.count("GET")
+                url = urlparse(self.path)
+                if url.path not in list_keys:
+                    return self.send({"code": 1, "error": "not found"}, 404)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                records = registry.find(url.path, params)
+                body = {"code": 0, "data": {list_keys[url.path]: records}}
+                etag = '"%s"' % hashlib.md5(json.dumps(
+                    body, sort_keys=True).encode()).hexdigest()
+                if etag in self.headers.get("If-None-Match", ""):
+                    with registry.lock:
+                        registry.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    return self.end_headers()
+                self.send(body, etag=etag)
+
+            def do_POST(self):
+                registry.count("POST")
+                url = urlparse(self.path)
+                data = self.rfile.read(int(self.headers.get(
+                    "Content-Length", 0)))
+                encoding = (self.headers.get("Content-Encoding"),
+                            self.headers.get("Content-Type"))
+                with registry.lock:
+                    registry.bytes_received += len(data)
+                    registry.posted.append(encoding)
+                if registry.reject_encoded and (
+                        encoding[0] or encoding[1] == MSGPACK):
+                    self.send_response(registry.reject_encoded)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", "0")
+                    return self.end_headers()
+                if self.headers.get("Content-Encoding"):
+                    data = decompress(data, self.headers["Content-Encoding"])
+                if self.headers.get("Content-Type") == MSGPACK:
+                    body = msgpack.unpackb(data, raw=False)
+                else:
+                    body = json.loads(data)
+                if url.path.endswith("/batch") and url.path[:-6] in \
+                        list_keys:
+                    ids = [registry.add(url.path[:-6], r) for r in body]
+                    return self.send({"code": 0, "data": {"ids": ids}})
+                if url.path not in list_keys:
+                    return self.send({"code": 1, "error": "not found"}, 404)
+                id = registry.add(url.path, body)
+                if id is None:
+                    return self.send({"code": 1, "error": "version already "
+                                      "exists"}, 400)
+                self.send({"code": 0, "data": {"id": id}})
+
+        return Handler
+
+
+class FakeUploader:
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Stand-in of upload_artifact, returning an S3 artifact without
+        uploading anything
+
+        Args:
+            latency: seconds waited per upload
+        """
+        self.latency = latency
+        self.uploads = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<FakeUploader latency=%s>" % self.latency
+
+    def __call__(self, path: str) -> S3Artifact:
+        time.sleep(self.latency)
+        with self.lock:
+            self.uploads += 1
+        key = "upload/%s/%s" % (uuid.uuid4(), os.path.basename(path))
+        return S3Artifact(key=key)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    registry = FakeRegistry(args.host, args.port, args.latency_ms / 1000)
+    print("serving on %s" % registry.url)
+    try:
+        registry.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
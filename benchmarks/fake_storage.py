@@ -0,0 +1,79 @@
+"""In-memory stand-in of the S3 multipart client of MultipartUploader for
+the tests, with failures injected into chosen parts"""
+import hashlib
+import threading
+import uuid
+from typing import Dict, Iterable
+
+
+class FakeMultipartClient:
+    def __init__(self, fail_parts: Iterable[int] = ()) -> None:
+        """
+        Multipart client storing the objects and the parts in memory
+
+        Args:
+            fail_parts: numbers of the parts whose next upload fails, once
+
+        Like S3, parts of an unknown (completed or aborted) upload are
+        refused, and completing an upload checks the ETags of its parts.
+        """
+        self.fail_parts = set(fail_parts)
+        self.uploads: Dict[str, dict] = {}
+        self.objects: Dict[str, bytes] = {}
+        self.aborted = []
+        self.parts_uploaded = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<FakeMultipartClient %s uploads, %s objects>" % (
+            len(self.uploads), len(self.objects))
+
+    def upload(self, key: str, upload_id: str) -> dict:
+        upload = self.uploads.get(upload_id)
+        if upload is None or upload["key"] != key:
+            raise KeyError("NoSuchUpload: %s" % upload_id)
+        return upload
+
+    def create(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.uploads[upload_id] = {"key": key, "parts": {}}
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, number: int,
+                    data: bytes) -> str:
+        with self.lock:
+            upload = self.upload(key, upload_id)
+            if number in self.fail_parts:
+                self.fail_parts.discard(number)
+                raise IOError("injected failure of part %s" % number)
+            etag = hashlib.md5(data).hexdigest()
+            upload["parts"][number] = (etag, data)
+            self.parts_uploaded += 1
+        return etag
+
+    def list_parts(self, key: str, upload_id: str) -> Dict[int, str]:
+        with self.lock:
+            return {n: etag for n, (etag, _) in
+                    self.upload(key, upload_id)["parts"].items()}
+
+    def complete(self, key: str, upload_id: str,
+                 parts: Dict[int, str]) -> None:
+        with self.lock:
+            stored = self.upload(key, upload_id)["parts"]
+            if sorted(parts) != list(range(1, len(parts) + 1)) or any(
+                    stored.get(n, (None, ))[0] != etag
+                    for n, etag in parts.items()):
+                raise ValueError("InvalidPart: %s" % upload_id)
+            self.objects[key] = b"".join(stored[n][1] for n in sorted(parts))
+            del self.uploads[upload_id]
+
+    def abort(self, key: str, upload_id: str) -> None:
+        with self.lock:
+            self.upload(key, upload_id)
+            del self.uploads[upload_id]
+            self.aborted.append(upload_id)
+
+    def put(self, key: str, data: bytes) -> None:
+        with self.lock:
+            self.objects[key] = data
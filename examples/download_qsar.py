@@ -15,17 +15,14 @@ pre_namespace = "qsar-benchmark"
 test = "test.csv"
 train = "train.csv"
 namespace_list = os.listdir(os.getcwd() + "/" + pre_namespace)
+keys = []
 for namespace in namespace_list:
     namespace = pre_namespace + "/" + namespace
-    pwd = os.getcwd()
-    os.chdir(namespace)
-    name_list = os.listdir(os.getcwd())
-    for name in name_list:
-        _pwd = os.getcwd()
-        os.chdir(name)
-        data = Dataset.query(namespace=namespace,
-                             name=name,
-                             version="v1.0.0.2")
-        print(data[0].id)
-        os.chdir(_pwd)
-    os.chdir(pwd)
+    for name in os.listdir(namespace):
+        keys.append((namespace, name, "v1.0.0.2"))
+# all the datasets are looked up at once
+for result in Dataset.query_many(keys=keys):
+    if result.entity is None:
+        print("%s/%s:%s not found" % result.key, result.error or "")
+    else:
+        print(result.entity.id)
@@ -16,6 +16,7 @@ pre_namespace = "qsar-benchmark"
 test = "test.csv"
 train = "train.csv"
 namespace_list = os.listdir(os.getcwd() + "/" + pre_namespace)
+datasets = []
 for namespace in namespace_list:
     namespace = pre_namespace + "/" + namespace
     pwd = os.getcwd()
@@ -40,7 +41,15 @@ for namespace in namespace_list:
                        version="v1.0.0.2",
                        location=[LocalPath(test),
                                  LocalPath(train)])
-        data.insert()
-        print(data.id)
+        # uploaded from the directory of the dataset, for the files to be
+        # at the root of the artifact
+        data.handle_local_artifacts()
+        datasets.append(data)
         os.chdir(_pwd)
     os.chdir(pwd)
+
+for res in Dataset.insert_many(datasets, concurrency=8):
+    if res.error is not None:
+        print("failed to register %s: %s" % (res.entity, res.error))
+    else:
+        print(res.id)
@@ -23,5 +23,12 @@ setup(
     install_requires=[
         "requests",
         "oss2",
-    ]
+    ],
+    extras_require={
+        "async": ["aiohttp"],
+        "otel": ["opentelemetry-api"],
+        "msgpack": ["msgpack"],
+        "zstd": ["zstandard"],
+        "test": ["pytest"],
+    }
 )
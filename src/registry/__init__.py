@@ -1,5 +1,30 @@
+from .aio import (AsyncRegistryClient, get_default_async_client,
+                  set_default_async_client)
 from .artifacts import (GitArtifact, HTTPArtifact, LocalPath)
-from .model import OP, Dataset, Model, Workflow
+from .bulk import InsertResult, QueryResult
+from .cache import MetadataStore, QueryCache, ValidatorCache
+from .client import (RegistryClient, RegistryError, get_default_client,
+                     set_default_client)
+from .download import (DownloadCache, Downloader, get_default_downloader,
+                       set_default_downloader)
+from .instrumentation import (Metrics, OpenTelemetryExporter, add_hook,
+                              remove_hook)
+from .lazy import S3Artifact
+from .lineage import LineageGraph
+from .model import OP, Dataset, Model, Reference, Workflow
+from .multipart import MinioMultipartClient, MultipartUploader
+from .upload import UploadIndex
+from .versions import VersionIndex
+from .wire import WireFormat
 
 __all__ = ["Model", "Dataset", "Workflow", "OP", "HTTPArtifact",
-           "S3Artifact", "OSSArtifact", "LocalPath", "GitArtifact"]
+           "S3Artifact", "OSSArtifact", "LocalPath", "GitArtifact",
+           "RegistryClient", "get_default_client", "set_default_client",
+           "Reference", "UploadIndex", "AsyncRegistryClient",
+           "get_default_async_client", "set_default_async_client",
+           "InsertResult", "QueryResult", "RegistryError", "QueryCache",
+           "MetadataStore", "ValidatorCache", "Downloader", "DownloadCache",
+           "get_default_downloader", "set_default_downloader",
+           "MultipartUploader", "MinioMultipartClient", "LineageGraph",
+           "Metrics", "OpenTelemetryExporter", "add_hook", "remove_hook",
+           "VersionIndex", "WireFormat"]
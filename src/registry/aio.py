@@ -0,0 +1,226 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Tuple
+
+from .cache import CachingMixin, MetadataStore, QueryCache, make_key
+from .client import DEFAULT_DOMAIN, get_default_client, succeeded
+from .instrumentation import instrumented_upload, span
+from .lazy import upload_artifact
+from .multipart import MultipartUploader
+from .singleflight import SingleFlight
+from .upload import (DEFAULT_UPLOAD_WORKERS, UploadIndex, iter_local_paths,
+                     replace_local_paths)
+from .wire import WireFormat
+
+
+class AsyncRegistryClient(CachingMixin):
+    def __init__(self,
+                 domain: str = DEFAULT_DOMAIN,
+                 limit: int = 100,
+                 timeout: float = 60,
+                 upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+                 upload_index: UploadIndex = None,
+                 multipart: MultipartUploader = None,
+                 cache: QueryCache = None,
+                 store: MetadataStore = None,
+                 coalesce: bool = True,
+                 indexes: list = None,
+                 wire: WireFormat = None) -> None:
+        """
+        Asynchronous client of the registry based on aiohttp
+
+        Args:
+            domain: default domain of the registry
+            limit: maximum number of simultaneous connections
+            timeout: total timeout of each request in seconds
+            upload_workers: number of threads running the blocking
+                artifact uploads, shared by all the entities inserted
+            upload_index: index used for skipping the upload of unchanged
+                local files
+            multipart: uploader of large local files in parts, files are
+                uploaded in one piece if not set
+            cache: cache of query responses, invalidated on registration
+            store: persistent store serving lookups by id or by
+                namespace/name:version, and every query in offline mode
+            coalesce: make a single request for identical queries made
+                concurrently by several tasks, the others awaiting its
+                response; single_flight.collapsed counts the requests saved
+            indexes: version indexes kept up to date with the registrations
+            wire: encoding of the bodies, see RegistryClient
+
+        The HTTP session is created on first use in the running event loop,
+        and created again if the client is used from another loop.
+        """
+        self.domain = domain
+        self.limit = limit
+        self.timeout = timeout
+        self.upload_workers = upload_workers
+        self.upload_index = upload_index
+        self.multipart = multipart
+        self.cache = cache
+        self.store = store
+        self.single_flight = SingleFlight() if coalesce else None
+        self.indexes = indexes if indexes is not None else []
+        self.wire = wire if wire is not None else WireFormat()
+        self.executor = None
+        self._session = None
+        self._loop = None
+
+    def __repr__(self):
+        return "<AsyncRegistryClient %s>" % self.domain
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def session(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("aiohttp is required by AsyncRegistryClient, "
+                              "install it by `pip install aiohttp`")
+        loop = asyncio.get_event_loop()
+        if self._session is None or self._session.closed or \
+                self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._loop = loop
+        return self._session
+
+    def url(self, path: str, domain: str = None) -> str:
+        return (domain or self.domain) + path
+
+    async def get(self,
+                  path: str,
+                  params: dict = None,
+                  domain: str = None) -> Optional[dict]:
+        # aiohttp rejects None values which requests drops silently
+        params = {k: str(v) for k, v in (params or {}).items()
+                  if v is not None}
+        url = self.url(path, domain)
+        d = self.cached(url, params)
+        if d is not None:
+            return d
+        if self.single_flight is None:
+            status, d = await self.fetch(url, path, params)
+        else:
+            status, d = await self.single_flight.ado(
+                make_key(url, params), self.fetch, url, path, params)
+        if d is None:
+            print("got unexcept http status:", status)
+        return d
+
+    async def fetch(self, url: str, path: str,
+                    params: dict) -> Tuple[int, Optional[dict]]:
+        with span("http", method="GET", path=path) as attributes:
+            async with self.session().get(
+                    url, params=params, headers=self.wire.accept()) as r:
+                content = await r.read()
+                content_type = r.headers.get("Content-Type")
+            attributes.update(status=r.status, retries=0,
+                              response_bytes=len(content))
+        if r.status < 200 or r.status >= 300:
+            return r.status, None
+        with span("decode", path=path, bytes=len(content)):
+            d = self.wire.decode(content, content_type)
+        self.remember(url, params, d)
+        return r.status, d
+
+    async def post(self,
+                   path: str,
+                   body: dict,
+                   domain: str = None) -> Optional[dict]:
+        headers, status, res = await self.send(path, body, domain)
+        if self.wire.undecoded(headers, status, res):
+            # the registry may not decode compressed or MessagePack bodies
+            _, status, res = await self.send(path, body, domain, plain=True)
+            self.wire.probed(headers, succeeded(status, res))
+        if status < 200 or status >= 300:
+            print("got unexcept http status:", status)
+            return
+        if res.get("code", 1) != 0:
+            print(res.get("error", "got error but no error set"))
+            return
+        data = res.get("data") or {}
+        for index in self.indexes:
+            index.registered(self.url(path, domain), body, data)
+        if self.cache is not None:
+            self.cache.invalidate(self.url(path, domain), mutable_only=True)
+        return data
+
+    async def send(self, path: str, body, domain: str = None,
+                   plain: bool = False) -> Tuple[dict, int, Optional[dict]]:
+        """Same as RegistryClient.send"""
+        with span("encode", path=path) as attributes:
+            data, headers = self.wire.encode(body, plain)
+            attributes["bytes"] = len(data)
+        with span("http", method="POST", path=path,
+                  request_bytes=len(data)) as attributes:
+            async with self.session().post(self.url(path, domain), data=data,
+                                           headers=headers) as r:
+                content = await r.read()
+                content_type = r.headers.get("Content-Type")
+            attributes.update(status=r.status, retries=0,
+                              response_bytes=len(content))
+        if r.status < 200 or r.status >= 300:
+            return headers, r.status, self.wire.decode_error(content,
+                                                             content_type)
+        with span("decode", path=path, bytes=len(content)):
+            res = self.wire.decode(content, content_type)
+        return headers, r.status, res
+
+    async def upload_local_artifacts(self,
+                                     obj,
+                                     keys: List[str],
+                                     upload=None) -> None:
+        """Upload the LocalPath artifacts of obj in the upload threads
+        without blocking the event loop, see upload_local_artifacts"""
+        slots = list(iter_local_paths(obj, keys))
+        if not slots:
+            return
+        if upload is None:
+            upload = self.multipart or upload_artifact
+        paths = list(dict.fromkeys(local.path for _, _, local in slots))
+        upload = instrumented_upload(upload)
+        if self.upload_index is not None:
+            upload = partial(self.upload_index.upload, upload=upload)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.upload_workers)
+        loop = asyncio.get_event_loop()
+        results = await asyncio.gather(
+            *[loop.run_in_executor(self.executor, upload, path)
+              for path in paths], return_exceptions=True)
+        replace_local_paths(obj, slots, dict(zip(paths, results)))
+
+
+_default_async_client = None
+
+
+def get_default_async_client() -> AsyncRegistryClient:
+    global _default_async_client
+    if _default_async_client is None:
+        client = get_default_client()
+        _default_async_client = AsyncRegistryClient(
+            domain=client.domain, upload_workers=client.upload_workers,
+            upload_index=client.upload_index, multipart=client.multipart,
+            cache=client.cache,
+            store=client.store, coalesce=client.single_flight is not None,
+            indexes=client.indexes, wire=client.wire)
+    return _default_async_client
+
+
+def set_default_async_client(client: AsyncRegistryClient) -> None:
+    global _default_async_client
+    _default_async_client = client
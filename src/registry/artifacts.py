@@ -1,4 +1,4 @@
-from dflow import S3Artifact
+from .lazy import S3Artifact
 
 
 class Artifact:
@@ -13,8 +13,13 @@ class Artifact:
 
 
 class HTTPArtifact(Artifact):
-    def __init__(self, url, **kwargs):
+    def __init__(self, url, md5=None, sha256=None, **kwargs):
         self.url = url
+        # digests are optional, only serialized if provided
+        if md5 is not None:
+            self.md5 = md5
+        if sha256 is not None:
+            self.sha256 = sha256
 
     def to_dict(self):
         return {"http": self.__dict__}
@@ -0,0 +1,191 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+from .client import RegistryClient, RegistryError, get_default_client
+
+DEFAULT_CONCURRENCY = 8
+
+InsertResult = namedtuple("InsertResult", ["entity", "id", "error"])
+InsertResult.__doc__ = """Result of registering an entity by insert_many,
+id is None and error is set if the registration failed"""
+
+QueryResult = namedtuple("QueryResult", ["key", "entity", "error"])
+QueryResult.__doc__ = """Result of looking up an id or a (namespace, name,
+version) key by query_many, entity is None if it is not found, or if the
+lookup failed in which case error is set"""
+
+
+def insert_one(entity, client: RegistryClient, domain: str = None) -> str:
+    body = entity.insert_body(client)
+    data = client.post(entity._endpoint, body, domain=domain,
+                       raise_error=True)
+    entity.id = data.get("id", "")
+    return entity.id
+
+
+def insert_many(cls,
+                entities: list,
+                concurrency: int = DEFAULT_CONCURRENCY,
+                domain: str = None,
+                client: RegistryClient = None) -> List[InsertResult]:
+    """
+    Register many entities of a class with bounded parallelism
+
+    Args:
+        cls: class of the entities
+        entities: entities to register
+        concurrency: number of entities prepared (artifacts uploaded and
+            serialized) and registered simultaneously
+        domain: domain of the registry
+        client: client used for registering, whose pool_maxsize should be
+            at least concurrency so that connections are all reused
+
+    Returns a result per entity, in the order of entities. Each worker
+    uploads the artifacts of an entity and registers it right away, so
+    uploads and registrations overlap. If the client has batch_size set,
+    prepared entities are instead registered batch_size at a time while
+    the following ones are still being uploaded.
+    """
+    client = client or get_default_client()
+    entities = list(entities)
+    if not entities:
+        return []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if client.batch_size:
+            futures = [executor.submit(entity.insert_body, client)
+                       for entity in entities]
+            return insert_batches(cls, entities, futures, client, domain)
+        futures = [executor.submit(insert_one, entity, client, domain)
+                   for entity in entities]
+    results = []
+    for entity, future in zip(entities, futures):
+        error = future.exception()
+        results.append(InsertResult(entity, None if error else
+                                    future.result(), error))
+    return results
+
+
+def insert_batches(cls, entities: list, futures: list,
+                   client: RegistryClient,
+                   domain: str = None) -> List[InsertResult]:
+    results = [None] * len(entities)
+    batch = []
+
+    def flush():
+        try:
+            data = client.post(cls._endpoint + "/batch",
+                               [body for _, body in batch], domain=domain,
+                               raise_error=True)
+            ids = data.get("ids") or []
+            if len(ids) != len(batch):
+                raise RegistryError("got %s ids for a batch of %s"
+                                    % (len(ids), len(batch)))
+        except Exception as e:
+            for i, _ in batch:
+                results[i] = InsertResult(entities[i], None, e)
+        else:
+            for (i, _), id in zip(batch, ids):
+                entities[i].id = id
+                results[i] = InsertResult(entities[i], id, None)
+        batch.clear()
+
+    for i, future in enumerate(futures):
+        error = future.exception()
+        if error is not None:
+            results[i] = InsertResult(entities[i], None, error)
+            continue
+        batch.append((i, future.result()))
+        if len(batch) >= client.batch_size:
+            flush()
+    if batch:
+        flush()
+    return results
+
+
+def fetch_many(cls,
+               ids: List[str] = None,
+               keys: List[Tuple[str, str, str]] = None,
+               concurrency: int = None,
+               domain: str = None,
+               client: RegistryClient = None
+               ) -> Tuple[list, Dict[Hashable, Union[dict, Exception]]]:
+    """
+    Fetch the records of entities of a class by id or by key
+
+    Args:
+        cls: class of the entities
+        ids: ids of the entities
+        keys: (namespace, name, version) of the entities, version being
+            possibly latest
+        concurrency: number of lookups made simultaneously, pool_maxsize of
+            the client by default
+        domain: domain of the registry
+        client: client used for querying
+
+    Returns the distinct lookups, ids as str or keys as tuples, in order,
+    and the record found (None if not found) or exception raised by each.
+    If the client has query_batch_size set, ids are looked up
+    query_batch_size at a time by comma-separated ids, simultaneously.
+    """
+    if (ids is None) == (keys is None):
+        raise ValueError("either ids or keys should be given")
+    client = client or get_default_client()
+    if ids is not None:
+        lookups = list(dict.fromkeys(str(id) for id in ids))
+    else:
+        lookups = list(dict.fromkeys(tuple(key) for key in keys))
+    if not lookups:
+        return [], {}
+    results = {}
+    workers = concurrency or client.pool_maxsize
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if ids is not None and client.query_batch_size:
+            size = client.query_batch_size
+            batches = [lookups[i:i + size]
+                       for i in range(0, len(lookups), size)]
+            futures = [executor.submit(fetch_batch, cls, batch, client,
+                                       domain) for batch in batches]
+            for batch, future in zip(batches, futures):
+                error = future.exception()
+                records = {} if error else future.result()
+                for id in batch:
+                    results[id] = error or records.get(id)
+            return lookups, results
+        fetch = fetch_by_id if ids is not None else fetch_by_key
+        futures = [executor.submit(fetch, cls, lookup, client, domain)
+                   for lookup in lookups]
+    for lookup, future in zip(lookups, futures):
+        results[lookup] = future.exception() or future.result()
+    return lookups, results
+
+
+def fetch_batch(cls, ids: List[str], client: RegistryClient,
+                domain: str = None) -> Dict[str, dict]:
+    d = client.get(cls._endpoint, params={"ids": ",".join(ids)},
+                   domain=domain, raise_error=True)
+    records = (d.get("data") or {}).get(cls._list_key) or []
+    return {str(r["id"]): r for r in records if r.get("id") is not None}
+
+
+def fetch_by_id(cls, id: str, client: RegistryClient,
+                domain: str = None) -> Optional[dict]:
+    d = client.get(cls._endpoint, params={"id": id}, domain=domain,
+                   raise_error=True)
+    records = (d.get("data") or {}).get(cls._list_key) or []
+    return records[0] if records else None
+
+
+def fetch_by_key(cls, key: Tuple[str, str, str], client: RegistryClient,
+                 domain: str = None) -> Optional[dict]:
+    namespace, name, version = key
+    d = client.get(cls._endpoint, params={
+        "namespace": namespace, "name": name, "version": version},
+        domain=domain, raise_error=True)
+    records = (d.get("data") or {}).get(cls._list_key) or []
+    # the registry matches patterns, keys are exact
+    for r in records:
+        if r.get("namespace") == namespace and r.get("name") == name and \
+                (version == "latest" or r.get("version") == version):
+            return r
+    return None
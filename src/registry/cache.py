@@ -0,0 +1,344 @@
+import fnmatch
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .utils import (get_cache_dir, json_dumps, json_loads,
+                    version_key)
+
+paging_params = ["page", "page_size", "cursor"]
+
+
+def make_key(url: str, params: dict = None) -> tuple:
+    """Cache key of a query, the URL of the endpoint (standing for the
+    entity type) with the parameters set"""
+    return (url, ) + tuple(sorted((k, str(v)) for k, v in
+                                  (params or {}).items() if v is not None))
+
+
+def is_empty(d: dict) -> bool:
+    """Whether a query response holds no entity"""
+    return not any((d.get("data") or {}).values())
+
+
+def is_mutable(params: dict = None) -> bool:
+    """Whether the results of a query may change when entities are
+    registered, i.e. unless it selects an id or an exact
+    namespace/name:version"""
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    if any(isinstance(v, str) and ("*" in v or "?" in v)
+           for v in params.values()):
+        return True
+    if "id" in params:
+        return False
+    return not all(k in params for k in ["namespace", "name", "version"]) \
+        or params["version"] == "latest"
+
+
+def is_projection(params: dict = None) -> bool:
+    """Whether a query only asks for some fields of the entities, whose
+    partial records must never replace full ones"""
+    return (params or {}).get("fields") is not None
+
+
+class QueryCache:
+    def __init__(self,
+                 maxsize: int = 1024,
+                 ttl: float = 3600,
+                 mutable_ttl: float = 10) -> None:
+        """
+        In-process cache of query responses with LRU eviction and expiry
+
+        Args:
+            maxsize: maximum number of responses kept
+            ttl: time to live in seconds of immutable responses (by id or
+                exact namespace/name:version)
+            mutable_ttl: time to live in seconds of the other responses
+                (latest versions, wildcards, listings) and of empty ones
+
+        Any object implementing get(key), set(key, value, mutable) and
+        invalidate(url, mutable_only) can be used as the cache of a client.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.mutable_ttl = mutable_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __repr__(self):
+        return "<QueryCache %s/%s>" % (len(self.entries), self.maxsize)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: tuple, value: Any, mutable: bool = False) -> None:
+        ttl = self.mutable_ttl if mutable else self.ttl
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, mutable, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, url: str = None, mutable_only: bool = False) -> None:
+        """Drop the responses of an endpoint, or of all endpoints if url is
+        not provided"""
+        with self.lock:
+            for key in list(self.entries):
+                if (url is None or key[0] == url) and \
+                        (not mutable_only or self.entries[key][1]):
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self.entries)}
+
+
+class ValidatorCache:
+    def __init__(self, maxsize: int = 1024) -> None:
+        """
+        Validators (ETag and Last-Modified) of query responses, used for
+        revalidating them by conditional requests, together with the
+        objects parsed from them
+
+        Args:
+            maxsize: maximum number of responses kept
+
+        When the registry answers 304 Not Modified, the stored response is
+        reused as is, and so are the objects parsed from it, which are thus
+        shared between the calls.
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.parsed_entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.not_modified = 0
+        self.modified = 0
+
+    def __repr__(self):
+        return "<ValidatorCache %s/%s>" % (len(self.entries), self.maxsize)
+
+    def headers(self, key: tuple) -> dict:
+        """Conditional headers of a query, empty if it is not known"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry[0]:
+            headers["If-None-Match"] = entry[0]
+        if entry[1]:
+            headers["If-Modified-Since"] = entry[1]
+        return headers
+
+    def response(self, key: tuple) -> Optional[dict]:
+        """Stored response of a query found not modified"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.not_modified += 1
+            return entry[2]
+
+    def set(self, key: tuple, etag: Optional[str],
+            last_modified: Optional[str], response: dict) -> None:
+        with self.lock:
+            self.modified += 1
+            if not etag and not last_modified:
+                self.entries.pop(key, None)
+                return
+            self.entries[key] = (etag, last_modified, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def parsed(self, key: tuple, response: dict) -> Optional[list]:
+        """Objects parsed from a response, None unless parsed from this
+        very response"""
+        with self.lock:
+            entry = self.parsed_entries.get(key)
+            if entry is None or entry[0] is not response:
+                return None
+            self.parsed_entries.move_to_end(key)
+            return entry[1]
+
+    def set_parsed(self, key: tuple, response: dict, objects: list) -> None:
+        with self.lock:
+            self.parsed_entries[key] = (response, objects)
+            self.parsed_entries.move_to_end(key)
+            while len(self.parsed_entries) > self.maxsize:
+                self.parsed_entries.popitem(last=False)
+
+    @property
+    def stats(self) -> dict:
+        return {"not_modified": self.not_modified, "modified": self.modified,
+                "size": len(self.entries)}
+
+
+class MetadataStore:
+    def __init__(self, path: str = None, offline: bool = False) -> None:
+        """
+        Persistent store of the records returned by the registry, so that
+        lookups by id or by namespace/name:version are served locally,
+        including by other processes
+
+        Args:
+            path: path of the SQLite database, metadata.db under the cache
+                directory by default
+            offline: serve every query from the store and never from the
+                registry, filtering the stored records for wildcards and
+                listings
+
+        The database is opened in WAL mode so that concurrent processes on
+        a node can read while one of them writes.
+        """
+        if path is None:
+            path = os.path.join(get_cache_dir(), "metadata.db")
+        self.path = path
+        self.offline = offline
+        self.local = threading.local()
+        conn = self.connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS records ("
+                         "url TEXT, list_key TEXT, id TEXT, namespace TEXT, "
+                         "name TEXT, version TEXT, body TEXT, updated REAL, "
+                         "PRIMARY KEY (url, id))")
+            conn.execute("CREATE INDEX IF NOT EXISTS records_nnv ON records "
+                         "(url, namespace, name, version)")
+
+    def __repr__(self):
+        return "<MetadataStore %s%s>" % (self.path,
+                                         " offline" if self.offline else "")
+
+    def connect(self) -> sqlite3.Connection:
+        # one connection per thread, sqlite3 connections are not shareable
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self.local.conn = conn
+        return conn
+
+    def get(self, url: str, params: dict = None) -> Optional[dict]:
+        """Response of a query built from the stored records, None if the
+        query cannot be served locally"""
+        page = int((params or {}).get("page") or 1)
+        params = {k: v for k, v in (params or {}).items()
+                  if v is not None and k not in paging_params}
+        conn = self.connect()
+        if page > 1:
+            # the stored records are all returned in the first page
+            rows = []
+        elif "id" in params:
+            rows = conn.execute("SELECT list_key, body FROM records WHERE "
+                                "url = ? AND id = ?",
+                                (url, str(params["id"]))).fetchall()
+        elif not is_mutable(params):
+            rows = conn.execute("SELECT list_key, body FROM records WHERE "
+                                "url = ? AND namespace = ? AND name = ? AND "
+                                "version = ?",
+                                (url, params["namespace"], params["name"],
+                                 params["version"])).fetchall()
+        elif self.offline:
+            rows = self.select(url, params)
+        else:
+            return None
+        if not rows and not self.offline:
+            return None
+        data = {}
+        for list_key, body in rows:
+            data.setdefault(list_key, []).append(json_loads(body))
+        return {"code": 0, "data": data}
+
+    def select(self, url: str, params: dict) -> list:
+        rows = self.connect().execute(
+            "SELECT list_key, body, namespace, name, version FROM records "
+            "WHERE url = ?", (url, )).fetchall()
+        rows = [row for row in rows if all(
+            fnmatch.fnmatchcase(row[i] or "", params[k])
+            for i, k in [(2, "namespace"), (3, "name"), (4, "version")]
+            if k in params and params[k] != "latest")]
+        if params.get("version") == "latest":
+            latest = {}
+            for row in rows:
+                key = (row[2], row[3])
+                if key not in latest or version_key(row[4] or "") > \
+                        version_key(latest[key][4] or ""):
+                    latest[key] = row
+            rows = list(latest.values())
+        return [row[:2] for row in rows]
+
+    def put(self, url: str, response: dict) -> None:
+        rows = []
+        now = time.time()
+        for list_key, lis in (response.get("data") or {}).items():
+            if not isinstance(lis, list):
+                continue
+            for record in lis:
+                if isinstance(record, dict) and record.get("id") is not None:
+                    rows.append((url, list_key, str(record["id"]),
+                                 record.get("namespace"), record.get("name"),
+                                 record.get("version"),
+                                 json_dumps(record).decode(), now))
+        if rows:
+            with self.connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO records VALUES "
+                                 "(?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+class CachingMixin:
+    """Lookup of query responses in the cache and store of a client"""
+    cache = None
+    store = None
+
+    def cached(self, url: str, params: dict = None) -> Optional[dict]:
+        if self.cache is not None:
+            d = self.cache.get(make_key(url, params))
+            if d is not None:
+                return d
+        if self.store is not None:
+            d = self.store.get(url, params)
+            if d is not None:
+                if self.cache is not None:
+                    self.cache.set(make_key(url, params), d,
+                                   mutable=is_mutable(params) or is_empty(d))
+                return d
+        return None
+
+    def remember(self, url: str, params: dict, d: dict,
+                 persist: bool = True) -> None:
+        if self.cache is not None:
+            self.cache.set(make_key(url, params), d,
+                           mutable=is_mutable(params) or is_empty(d))
+        # the store is keyed by id only, projected queries being told apart
+        # by the cache keys
+        if self.store is not None and persist and not is_projection(params):
+            self.store.put(url, d)
@@ -0,0 +1,313 @@
+from typing import Callable, Iterator, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import (CachingMixin, MetadataStore, QueryCache, ValidatorCache,
+                    make_key)
+from .instrumentation import retries, span
+from .multipart import MultipartUploader
+from .singleflight import SingleFlight
+from .stream import DEFAULT_CHUNK_SIZE, iter_json_items
+from .upload import DEFAULT_UPLOAD_WORKERS, UploadIndex
+from .wire import RESPONSE_ENCODINGS, WireFormat
+
+DEFAULT_DOMAIN = "http://registration-center.test.dp.tech"
+
+
+class RegistryError(Exception):
+    pass
+
+
+def succeeded(status: int, res: Optional[dict]) -> bool:
+    """Whether a registration has been accepted"""
+    return 200 <= status < 300 and res is not None and \
+        res.get("code", 1) == 0
+
+
+class RegistryClient(CachingMixin):
+    def __init__(self,
+                 domain: str = DEFAULT_DOMAIN,
+                 pool_connections: int = 10,
+                 pool_maxsize: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = (10, 60),
+                 max_retries: int = 0,
+                 upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+                 upload_index: UploadIndex = None,
+                 multipart: MultipartUploader = None,
+                 batch_size: int = None,
+                 query_batch_size: int = None,
+                 cache: QueryCache = None,
+                 store: MetadataStore = None,
+                 validators: ValidatorCache = None,
+                 session: requests.Session = None,
+                 coalesce: bool = True,
+                 wire: WireFormat = None) -> None:
+        """
+        Client of the registry holding a pooled HTTP session, so that
+        connections are kept alive and reused across calls
+
+        Args:
+            domain: default domain of the registry
+            pool_connections: number of connection pools to cache
+            pool_maxsize: maximum number of connections kept per pool
+            timeout: timeout of each request in seconds, either a single
+                value or a (connect, read) tuple
+            max_retries: number of retries on connection errors
+            upload_workers: maximum number of concurrent artifact uploads
+                of an entity
+            upload_index: index used for skipping the upload of unchanged
+                local files
+            multipart: uploader of large local files in parts, files are
+                uploaded in one piece if not set
+            batch_size: number of entities registered per request by
+                insert_many, for registries accepting a list of entities
+                POSTed to <endpoint>/batch and returning their ids in
+                data.ids; entities are registered one by one if not set
+            query_batch_size: number of ids looked up per request by
+                query_many, for registries accepting comma-separated ids
+                in the ids parameter; ids are looked up one by one
+                (concurrently) if not set
+            cache: cache of query responses, invalidated on registration
+            store: persistent store serving lookups by id or by
+                namespace/name:version, and every query in offline mode
+            validators: validators of query responses, for revalidating
+                them by conditional requests
+            session: an existing session to use instead of a new one
+            coalesce: make a single request for identical queries made
+                concurrently by several threads, the others waiting for
+                its response; single_flight.collapsed counts the requests
+                saved
+            wire: encoding of the bodies, plain JSON requests and
+                compressed responses by default, MessagePack being
+                negotiated if msgpack is installed, see WireFormat
+        """
+        self.domain = domain
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.upload_workers = upload_workers
+        self.upload_index = upload_index
+        self.multipart = multipart
+        self.batch_size = batch_size
+        self.query_batch_size = query_batch_size
+        self.cache = cache
+        self.store = store
+        self.validators = validators
+        self.single_flight = SingleFlight() if coalesce else None
+        self.wire = wire if wire is not None else WireFormat()
+        # version indexes kept up to date with the registrations
+        self.indexes = []
+        if session is None:
+            session = requests.Session()
+            session.headers["Accept-Encoding"] = RESPONSE_ENCODINGS
+        self.session = session
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              max_retries=max_retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __repr__(self):
+        return "<RegistryClient %s>" % self.domain
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path: str, domain: str = None) -> str:
+        return (domain or self.domain) + path
+
+    def get(self,
+            path: str,
+            params: dict = None,
+            domain: str = None,
+            raise_error: bool = False) -> Optional[dict]:
+        url = self.url(path, domain)
+        d = self.cached(url, params)
+        if d is not None:
+            return d
+        if self.single_flight is None:
+            status, d = self.fetch(url, path, params)
+        else:
+            status, d = self.single_flight.do(make_key(url, params),
+                                              self.fetch, url, path, params)
+        if d is None:
+            return self.error("got unexcept http status: %s" % status,
+                              raise_error)
+        return d
+
+    def fetch(self, url: str, path: str, params: dict = None,
+              revalidate: bool = True) -> Tuple[int, Optional[dict]]:
+        """GET a query and remember the response, returning the status and
+        the response (None unless successful), the request being
+        conditional if revalidate and validators of the response are
+        kept"""
+        headers = self.wire.accept()
+        conditional = None
+        if self.validators is not None:
+            key = make_key(url, params)
+            if revalidate:
+                conditional = self.validators.headers(key)
+                headers.update(conditional)
+        with span("http", method="GET", path=path) as attributes:
+            r = self.session.get(url=url, params=params, headers=headers,
+                                 timeout=self.timeout)
+            attributes.update(status=r.status_code, retries=retries(r),
+                              response_bytes=len(r.content))
+        if r.status_code == 304 and conditional:
+            d = self.validators.response(key)
+            if d is not None:
+                self.remember(url, params, d, persist=False)
+                return r.status_code, d
+            # evicted since the request, the response is needed again
+            return self.fetch(url, path, params, revalidate=False)
+        if r.status_code < 200 or r.status_code >= 300:
+            return r.status_code, None
+        with span("decode", path=path, bytes=len(r.content)):
+            d = self.wire.decode(r.content, r.headers.get("Content-Type"))
+        if self.validators is not None:
+            self.validators.set(key, r.headers.get("ETag"),
+                                r.headers.get("Last-Modified"), d)
+        self.remember(url, params, d)
+        return r.status_code, d
+
+    def iter_records(self,
+                     path: str,
+                     params: dict,
+                     list_key: str,
+                     domain: str = None,
+                     raise_error: bool = False) -> Iterator[dict]:
+        """
+        Query and decode the records of data.<list_key> one at a time while
+        the response is received, so that the whole response is never held
+
+        Args:
+            path: path of the endpoint
+            params: parameters of the query
+            list_key: key of the records in data
+            domain: domain of the registry
+            raise_error: raise RegistryError instead of printing errors
+
+        Responses cached or stored are used if any, but streamed responses
+        are not cached nor revalidated.
+        """
+        url = self.url(path, domain)
+        d = self.cached(url, params)
+        if d is not None:
+            yield from (d.get("data") or {}).get(list_key) or []
+            return
+        # timed until the headers are received, the records are decoded
+        # while being consumed
+        with span("http", method="GET", path=path, stream=True) as attributes:
+            r = self.session.get(url=url, params=params, stream=True,
+                                 headers=self.wire.accept(stream=True),
+                                 timeout=self.timeout)
+            attributes.update(status=r.status_code, retries=retries(r))
+        with r:
+            if r.status_code < 200 or r.status_code >= 300:
+                self.error("got unexcept http status: %s" % r.status_code,
+                           raise_error)
+                return
+            yield from iter_json_items(
+                r.iter_content(chunk_size=DEFAULT_CHUNK_SIZE),
+                ("data", list_key))
+
+    def get_parsed(self,
+                   path: str,
+                   params: dict,
+                   parse: Callable[[dict], list],
+                   domain: str = None,
+                   variant=None) -> Optional[list]:
+        """
+        Query and parse the response, reusing the objects parsed from a
+        response found not modified (or cached) if validators are kept
+
+        Args:
+            path: path of the endpoint
+            params: parameters of the query
+            parse: function parsing a response into a list of objects
+            domain: domain of the registry
+            variant: anything besides the query that parse depends on
+        """
+        d = self.get(path, params=params, domain=domain)
+        if d is None:
+            return None
+        if self.validators is None:
+            return parse(d)
+        key = (make_key(self.url(path, domain), params), variant)
+        objects = self.validators.parsed(key, d)
+        if objects is None:
+            objects = parse(d)
+            self.validators.set_parsed(key, d, objects)
+        return list(objects)
+
+    def post(self,
+             path: str,
+             body: dict,
+             domain: str = None,
+             raise_error: bool = False) -> Optional[dict]:
+        headers, status, res = self.send(path, body, domain)
+        if self.wire.undecoded(headers, status, res):
+            # the registry may not decode compressed or MessagePack bodies
+            _, status, res = self.send(path, body, domain, plain=True)
+            self.wire.probed(headers, succeeded(status, res))
+        if status < 200 or status >= 300:
+            return self.error("got unexcept http status: %s" % status,
+                              raise_error)
+        if res.get("code", 1) != 0:
+            return self.error(res.get("error", "got error but no error set"),
+                              raise_error)
+        data = res.get("data") or {}
+        for index in self.indexes:
+            index.registered(self.url(path, domain), body, data)
+        if self.cache is not None:
+            if path.endswith("/batch"):
+                path = path[:-len("/batch")]
+            self.cache.invalidate(self.url(path, domain), mutable_only=True)
+        return data
+
+    def send(self, path: str, body, domain: str = None,
+             plain: bool = False) -> Tuple[dict, int, Optional[dict]]:
+        """POST a body, returning the headers sent, the status and the
+        response (None if not decoded)"""
+        with span("encode", path=path) as attributes:
+            data, headers = self.wire.encode(body, plain)
+            attributes["bytes"] = len(data)
+        with span("http", method="POST", path=path,
+                  request_bytes=len(data)) as attributes:
+            r = self.session.post(url=self.url(path, domain), data=data,
+                                  headers=headers, timeout=self.timeout)
+            attributes.update(status=r.status_code, retries=retries(r),
+                              response_bytes=len(r.content))
+        if r.status_code < 200 or r.status_code >= 300:
+            return headers, r.status_code, self.wire.decode_error(
+                r.content, r.headers.get("Content-Type"))
+        with span("decode", path=path, bytes=len(r.content)):
+            res = self.wire.decode(r.content, r.headers.get("Content-Type"))
+        return headers, r.status_code, res
+
+    @staticmethod
+    def error(msg: str, raise_error: bool = False) -> None:
+        if raise_error:
+            raise RegistryError(msg)
+        print(msg)
+
+
+_default_client = None
+
+
+def get_default_client() -> RegistryClient:
+    global _default_client
+    if _default_client is None:
+        _default_client = RegistryClient()
+    return _default_client
+
+
+def set_default_client(client: RegistryClient) -> None:
+    global _default_client
+    _default_client = client
@@ -0,0 +1,293 @@
+import base64
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import unquote, urlparse
+
+import requests
+
+from .artifacts import HTTPArtifact
+from .hashing import hash_file
+from .lazy import S3Artifact, download_artifact
+from .utils import get_cache_dir
+
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_SPLIT_THRESHOLD = 256 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadCache:
+    def __init__(self, path: str = None) -> None:
+        """
+        Local content-addressed cache of downloaded artifacts, so that
+        downloading an artifact again on the same node only links or copies
+        local files
+
+        Args:
+            path: root directory of the cache, downloads under the cache
+                directory by default
+
+        Files downloaded by HTTP are stored once per SHA-256 digest under
+        blobs/ and indexed by URL. S3 artifacts, whose keys are unique per
+        upload, are stored as trees under trees/ indexed by key.
+        """
+        if path is None:
+            path = get_cache_dir("downloads")
+        self.path = path
+        os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(path, "trees"), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sources ("
+                         "source TEXT PRIMARY KEY, digest TEXT, "
+                         "size INTEGER, created REAL)")
+
+    def __repr__(self):
+        return "<DownloadCache %s>" % self.path
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(os.path.join(self.path, "index.db"),
+                               timeout=30)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, "blobs", digest[:2], digest)
+
+    def tree_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.path, "trees", digest[:2], digest)
+
+    def lookup(self, source: str) -> Optional[str]:
+        """Path of the cached blob of a source, None if not cached"""
+        with self.connect() as conn:
+            row = conn.execute("SELECT digest, size FROM sources WHERE "
+                               "source = ?", (source, )).fetchone()
+        if row is None:
+            return None
+        path = self.blob_path(row[0])
+        if not os.path.isfile(path) or os.path.getsize(path) != row[1]:
+            return None
+        return path
+
+    def add(self, source: str, path: str, digest: str = None) -> str:
+        """Store a downloaded file as the blob of a source"""
+        if digest is None:
+            digest = hash_file(path, ["sha256"])["sha256"]
+        blob = self.blob_path(digest)
+        if not os.path.isfile(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = "%s.%s.tmp" % (blob, os.getpid())
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, blob)
+        with self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                         (source, digest, os.path.getsize(blob), time.time()))
+        return blob
+
+    def lookup_tree(self, key: str) -> Optional[str]:
+        path = self.tree_path(key)
+        return path if os.path.isdir(path) else None
+
+    def add_tree(self, key: str, path: str) -> None:
+        tree = self.tree_path(key)
+        if os.path.isdir(tree):
+            return
+        tmp = "%s.%s.tmp" % (tree, os.getpid())
+        shutil.copytree(path, tmp)
+        try:
+            os.rename(tmp, tree)
+        except OSError:
+            # stored meanwhile by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def link_or_copy_tree(src: str, dst: str) -> None:
+    for root, _, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target, exist_ok=True)
+        for f in files:
+            link_or_copy(os.path.join(root, f), os.path.join(target, f))
+
+
+class Downloader:
+    def __init__(self,
+                 max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                 part_size: int = DEFAULT_PART_SIZE,
+                 split_threshold: int = DEFAULT_SPLIT_THRESHOLD,
+                 cache: DownloadCache = None,
+                 session: requests.Session = None,
+                 timeout: float = 60) -> None:
+        """
+        Downloader of the artifacts of models and datasets
+
+        Args:
+            max_workers: maximum number of artifacts, and of parts of each
+                large file, downloaded simultaneously
+            part_size: size of the parts of a large file
+            split_threshold: size above which files served with range
+                support are downloaded in parallel parts
+            cache: local cache of downloaded artifacts
+            session: HTTP session used for downloading
+            timeout: timeout of each HTTP request in seconds
+
+        Interrupted HTTP downloads are resumed from the partial files left
+        in the destination. Downloaded files are checked against the md5 or
+        sha256 of the HTTPArtifact if set, and against the Content-MD5
+        header if sent.
+        """
+        self.max_workers = max_workers
+        self.part_size = part_size
+        self.split_threshold = split_threshold
+        self.cache = cache
+        self.session = session if session is not None else requests.Session()
+        self.timeout = timeout
+
+    def download(self, location, dest: str):
+        """
+        Download an artifact, or a dict or list of artifacts, into dest
+
+        Returns the local path(s) in the same form as location: the
+        artifacts of a dict are downloaded to dest/<key> and those of a
+        list to dest/<index>.
+        """
+        if isinstance(location, dict):
+            items = [(k, v, os.path.join(dest, str(k)))
+                     for k, v in location.items()]
+        elif isinstance(location, list):
+            items = [(i, v, os.path.join(dest, str(i)))
+                     for i, v in enumerate(location)]
+        else:
+            return self.download_artifact(location, dest)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            paths = list(executor.map(lambda item: self.download_artifact(
+                item[1], item[2]), items))
+        if isinstance(location, dict):
+            return {k: p for (k, _, _), p in zip(items, paths)}
+        return paths
+
+    def download_artifact(self, artifact, dest: str) -> str:
+        os.makedirs(dest, exist_ok=True)
+        if isinstance(artifact, HTTPArtifact):
+            return self.download_http(artifact.url, dest, digests={
+                a: getattr(artifact, a) for a in ["md5", "sha256"]
+                if getattr(artifact, a, None)})
+        elif isinstance(artifact, S3Artifact):
+            return self.download_s3(artifact, dest)
+        raise TypeError("%s is not supported for downloading"
+                        % type(artifact))
+
+    def download_s3(self, artifact: S3Artifact, dest: str) -> str:
+        key = artifact.key
+        if self.cache is not None:
+            tree = self.cache.lookup_tree(key)
+            if tree is not None:
+                link_or_copy_tree(tree, dest)
+                return dest
+        download_artifact(artifact, path=dest)
+        if self.cache is not None:
+            self.cache.add_tree(key, dest)
+        return dest
+
+    def download_http(self,
+                      url: str,
+                      dest: str,
+                      digests: Dict[str, str] = None) -> str:
+        name = unquote(os.path.basename(urlparse(url).path)) or "index"
+        path = os.path.join(dest, name)
+        if self.cache is not None:
+            blob = self.cache.lookup(url)
+            if blob is not None:
+                link_or_copy(blob, path)
+                return path
+        r = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        size = int(r.headers.get("Content-Length") or 0) if r.ok else 0
+        ranges = r.ok and r.headers.get("Accept-Ranges") == "bytes"
+        digests = dict(digests or {})
+        if r.ok and r.headers.get("Content-MD5"):
+            digests.setdefault("md5", base64.b64decode(
+                r.headers["Content-MD5"]).hex())
+        part = path + ".part"
+        if ranges and size > self.split_threshold:
+            self.fetch_parts(url, part, size)
+        else:
+            self.fetch(url, part, size if ranges else 0)
+        sums = hash_file(part, ["sha256"] + [a for a in digests
+                                             if a != "sha256"])
+        for a, expected in digests.items():
+            if sums[a] != expected.lower():
+                os.remove(part)
+                raise IOError("%s digest of %s is %s, expected %s"
+                              % (a, url, sums[a], expected))
+        os.replace(part, path)
+        if self.cache is not None:
+            self.cache.add(url, path, digest=sums["sha256"])
+        return path
+
+    def fetch(self, url: str, path: str, size: int = 0,
+              start: int = 0, end: int = None) -> None:
+        """Download bytes [start, end) of url into path, resuming from the
+        bytes already in path if size (or end) is known"""
+        end = end if end is not None else size
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if not end or offset > end - start:
+            offset = 0
+        if end and offset == end - start:
+            return
+        headers = {}
+        if end and (start or offset or end < size):
+            headers["Range"] = "bytes=%s-%s" % (start + offset, end - 1)
+        with self.session.get(url, headers=headers, stream=True,
+                              timeout=self.timeout) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                offset = 0
+            with open(path, "ab" if offset else "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+        if end and os.path.getsize(path) != end - start:
+            raise IOError("incomplete download of %s" % url)
+
+    def fetch_parts(self, url: str, path: str, size: int) -> None:
+        """Download url in parallel parts, each of them resumable, then
+        assemble them into path"""
+        bounds = [(i, min(i + self.part_size, size))
+                  for i in range(0, size, self.part_size)]
+        parts = ["%s.%s" % (path, i) for i in range(len(bounds))]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for future in [executor.submit(self.fetch, url, p, size, s, e)
+                           for p, (s, e) in zip(parts, bounds)]:
+                future.result()
+        with open(path, "wb") as f:
+            for p in parts:
+                with open(p, "rb") as fp:
+                    shutil.copyfileobj(fp, f, CHUNK_SIZE)
+        for p in parts:
+            os.remove(p)
+
+
+_default_downloader = None
+
+
+def get_default_downloader() -> Downloader:
+    global _default_downloader
+    if _default_downloader is None:
+        _default_downloader = Downloader()
+    return _default_downloader
+
+
+def set_default_downloader(downloader: Downloader) -> None:
+    global _default_downloader
+    _default_downloader = downloader
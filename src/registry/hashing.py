@@ -0,0 +1,162 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Sequence
+
+DEFAULT_ALGORITHMS = ("md5", "sha256")
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def hash_file(path: str,
+              algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+              buffer_size: int = DEFAULT_BUFFER_SIZE,
+              use_mmap: bool = False) -> Dict[str, str]:
+    """
+    Compute several digests of a file in a single pass
+
+    Args:
+        path: path of the file
+        algorithms: names of the hashlib algorithms
+        buffer_size: size of each read
+        use_mmap: map the file into memory instead of reading it
+
+    Returns a dict from algorithm to hex digest. hashlib releases the GIL
+    while hashing large buffers, so files can be hashed in parallel threads.
+    """
+    hashes = [hashlib.new(a) for a in algorithms]
+    with open(path, "rb") as fobj:
+        if use_mmap:
+            # empty files cannot be mapped
+            if os.fstat(fobj.fileno()).st_size > 0:
+                with mmap.mmap(fobj.fileno(), 0,
+                               access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)
+                    try:
+                        for i in range(0, len(view), buffer_size):
+                            for h in hashes:
+                                h.update(view[i:i + buffer_size])
+                    finally:
+                        view.release()
+        else:
+            buf = bytearray(buffer_size)
+            view = memoryview(buf)
+            while True:
+                n = fobj.readinto(buf)
+                if not n:
+                    break
+                for h in hashes:
+                    h.update(view[:n])
+    return {a: h.hexdigest() for a, h in zip(algorithms, hashes)}
+
+
+class HashCache:
+    def __init__(self, path: str = None) -> None:
+        """
+        Cache of file digests keyed by (path, size, mtime), so that
+        unchanged files are not read again
+
+        Args:
+            path: path of a SQLite database persisting the cache, kept in
+                memory only if not provided
+        """
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path is not None:
+            with self.connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS digests ("
+                             "path TEXT, size INTEGER, mtime INTEGER, "
+                             "algorithm TEXT, digest TEXT, "
+                             "PRIMARY KEY (path, size, mtime, algorithm))")
+
+    def __repr__(self):
+        return "<HashCache %s>" % (self.path or "memory")
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def stat_key(path: str) -> tuple:
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    def get(self, key: tuple,
+            algorithms: Sequence[str]) -> Optional[Dict[str, str]]:
+        with self.lock:
+            digests = dict(self.entries.get(key, {}))
+        if self.path is not None and not all(a in digests
+                                             for a in algorithms):
+            with self.connect() as conn:
+                rows = conn.execute("SELECT algorithm, digest FROM digests "
+                                    "WHERE path = ? AND size = ? AND "
+                                    "mtime = ?", key).fetchall()
+            digests.update(rows)
+        if all(a in digests for a in algorithms):
+            return {a: digests[a] for a in algorithms}
+        return None
+
+    def put(self, key: tuple, digests: Dict[str, str]) -> None:
+        with self.lock:
+            self.entries.setdefault(key, {}).update(digests)
+        if self.path is not None:
+            with self.connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO digests VALUES "
+                                 "(?, ?, ?, ?, ?)",
+                                 [key + (a, d) for a, d in digests.items()])
+
+
+_default_cache = None
+
+
+def get_default_hash_cache() -> HashCache:
+    """In-memory cache of the digests shared by the uploads of the
+    process"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HashCache()
+    return _default_cache
+
+
+def hash_file_cached(path: str,
+                     algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+                     cache: HashCache = None,
+                     **kwargs) -> Dict[str, str]:
+    """Same as hash_file, not reading the file if its digests are cached"""
+    if cache is None:
+        return hash_file(path, algorithms, **kwargs)
+    key = HashCache.stat_key(path)
+    digests = cache.get(key, algorithms)
+    if digests is None:
+        digests = hash_file(path, algorithms, **kwargs)
+        cache.put(key, digests)
+    return digests
+
+
+def hash_files(paths: Iterable[str],
+               algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+               max_workers: int = None,
+               cache: HashCache = None,
+               **kwargs) -> Dict[str, Dict[str, str]]:
+    """
+    Compute the digests of many files in parallel threads
+
+    Args:
+        paths: paths of the files
+        algorithms: names of the hashlib algorithms
+        max_workers: number of threads, min(32, cpu count + 4) by default
+        cache: skip reading the files whose digests are cached
+        kwargs: other arguments of hash_file
+
+    Returns a dict from path to the digests of the file.
+    """
+    def task(path):
+        return hash_file_cached(path, algorithms, cache, **kwargs)
+
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(paths, executor.map(task, paths)))
@@ -0,0 +1,280 @@
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+# callables receiving each Event, see add_hook
+hooks: List[Callable] = []
+
+
+class Event:
+    __slots__ = ("name", "start", "duration", "attributes")
+
+    def __init__(self, name: str, start: float, duration: float,
+                 attributes: dict) -> None:
+        """
+        Step of the SDK that has been timed
+
+        Args:
+            name: kind of step: http (requests to the registry), upload
+                (of a local path), encode and decode (of JSON bodies),
+                to_dict and from_dict (of entities)
+            start: time.time() at the start of the step
+            duration: seconds spent in the step
+            attributes: details of the step, e.g. method, path, status,
+                request_bytes, response_bytes and retries of http events,
+                and error if the step raised
+        """
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attributes = attributes
+
+    def __repr__(self):
+        return "<Event %s %.6fs %s>" % (self.name, self.duration,
+                                        self.attributes)
+
+
+def add_hook(hook: Callable) -> None:
+    """Call hook with each Event of the SDK, from the thread of the step"""
+    hooks.append(hook)
+
+
+def remove_hook(hook: Callable) -> None:
+    hooks.remove(hook)
+
+
+def emit(event: Event) -> None:
+    for hook in list(hooks):
+        try:
+            hook(event)
+        except Exception as e:
+            print("instrumentation hook %r failed: %s" % (hook, e))
+
+
+class span:
+    __slots__ = ("name", "attributes", "start", "counter")
+
+    def __init__(self, name: str, **attributes) -> None:
+        """
+        Time the step run in the with block and emit its Event, if any hook
+        is installed
+
+        Args:
+            name: name of the event
+            attributes: attributes of the event, the step can add others to
+                the dict returned by __enter__
+        """
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+
+    def __enter__(self) -> dict:
+        if hooks:
+            self.start = time.time()
+            self.counter = time.perf_counter()
+        return self.attributes
+
+    def __exit__(self, typ, value, tb):
+        if self.start is None or not hooks:
+            return
+        duration = time.perf_counter() - self.counter
+        if value is not None:
+            self.attributes["error"] = typ.__name__
+        emit(Event(self.name, self.start, duration, self.attributes))
+
+
+def instrumented_upload(upload: Callable) -> Callable:
+    """Wrap a function uploading a local path so that each upload emits an
+    upload event"""
+    def wrapper(path):
+        with span("upload", path=path) as attributes:
+            if hooks:
+                attributes["size"] = local_size(path)
+            return upload(path)
+    return wrapper
+
+
+def local_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+    return size
+
+
+def retries(r) -> int:
+    """Number of retries of a requests response"""
+    retry = getattr(r.raw, "retries", None)
+    return len(retry.history) if retry is not None else 0
+
+
+class Histogram:
+    # buckets grow by 2 ** (1 / 8), percentiles are overestimated by 9% at most
+    resolution = 8
+
+    def __init__(self) -> None:
+        """Log-bucketed histogram of durations"""
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def __repr__(self):
+        return "<Histogram count=%s>" % self.count
+
+    def record(self, value: float) -> None:
+        bucket = math.floor(math.log2(value) * self.resolution) if value > 0 \
+            else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (0 <= q <= 1),
+        capped by the largest value recorded"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets, key=lambda b: -math.inf
+                             if b is None else b):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                if bucket is None:
+                    return 0.0
+                return min(2 ** ((bucket + 1) / self.resolution), self.max)
+        return self.max
+
+
+class Metrics:
+    def __init__(self) -> None:
+        """
+        Hook keeping in memory a histogram of durations per event name and
+        endpoint (or entity class, or nothing), with counts of errors and
+        of bytes sent and received
+
+            metrics = Metrics()
+            add_hook(metrics)
+            ...
+            for row in metrics.summary():
+                print(row)
+        """
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.errors: Dict[tuple, int] = {}
+        self.bytes: Dict[tuple, int] = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Metrics %s series>" % len(self.histograms)
+
+    @staticmethod
+    def key(event: Event) -> tuple:
+        a = event.attributes
+        return (event.name, a.get("method"),
+                a.get("path") if event.name != "upload" else None,
+                a.get("entity"))
+
+    def __call__(self, event: Event) -> None:
+        key = self.key(event)
+        a = event.attributes
+        size = (a.get("request_bytes") or 0) + (a.get("response_bytes") or 0)\
+            + (a.get("size") or a.get("bytes") or 0)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.record(event.duration)
+            if "error" in a or (a.get("status") or 0) >= 300:
+                self.errors[key] = self.errors.get(key, 0) + 1
+            if size:
+                self.bytes[key] = self.bytes.get(key, 0) + size
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms.clear()
+            self.errors.clear()
+            self.bytes.clear()
+
+    def summary(self) -> List[dict]:
+        """A row per series with its count, errors, bytes, mean, p50, p90,
+        p99 and max duration in seconds"""
+        rows = []
+        with self.lock:
+            for key, h in self.histograms.items():
+                name, method, path, entity = key
+                rows.append({"event": name, "method": method, "path": path,
+                             "entity": entity, "count": h.count,
+                             "errors": self.errors.get(key, 0),
+                             "bytes": self.bytes.get(key, 0),
+                             "mean": h.sum / h.count,
+                             "p50": h.percentile(0.5),
+                             "p90": h.percentile(0.9),
+                             "p99": h.percentile(0.99), "max": h.max})
+        return rows
+
+
+class OpenTelemetryExporter:
+    def __init__(self, meter_provider=None, tracer_provider=None,
+                 spans: bool = True) -> None:
+        """
+        Hook exporting the events to OpenTelemetry, as a histogram of
+        durations per event name (registry.<name>.duration, in seconds)
+        and as spans
+
+        Args:
+            meter_provider: meter provider, the global one by default
+            tracer_provider: tracer provider, the global one by default
+            spans: export a span per event as well
+        """
+        try:
+            from opentelemetry import metrics, trace
+        except ImportError:
+            raise ImportError("OpenTelemetryExporter requires opentelemetry, "
+                              "install it by `pip install opentelemetry-api`")
+        self.meter = metrics.get_meter("registry",
+                                       meter_provider=meter_provider)
+        self.tracer = trace.get_tracer("registry",
+                                       tracer_provider=tracer_provider) \
+            if spans else None
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<OpenTelemetryExporter>"
+
+    def histogram(self, name: str):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.meter.create_histogram(
+                        "registry.%s.duration" % name, unit="s",
+                        description="duration of the %s steps" % name)
+                    self.histograms[name] = histogram
+        return histogram
+
+    def __call__(self, event: Event) -> None:
+        attributes = {k: v for k, v in event.attributes.items()
+                      if isinstance(v, (str, bool, int, float))}
+        # paths of uploads would make too many series
+        self.histogram(event.name).record(event.duration, {
+            k: v for k, v in attributes.items()
+            if k in ("method", "path", "status", "entity", "error")
+            and event.name != "upload" or k == "error"})
+        if self.tracer is not None:
+            from opentelemetry.trace import Status, StatusCode
+            span = self.tracer.start_span(
+                "registry.%s" % event.name, attributes=attributes,
+                start_time=int(event.start * 1e9))
+            if "error" in attributes:
+                span.set_status(Status(StatusCode.ERROR,
+                                       attributes["error"]))
+            span.end(end_time=int((event.start + event.duration) * 1e9))
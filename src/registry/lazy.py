@@ -0,0 +1,81 @@
+import importlib
+import sys
+
+
+class LazyModule:
+    def __init__(self, name: str) -> None:
+        """
+        Module imported on the first access to any of its attributes
+
+        Args:
+            name: name of the module
+        """
+        self._name = name
+        self._module = None
+
+    def __repr__(self):
+        return "<LazyModule %s%s>" % (self._name, "" if self.loaded else
+                                      " (not loaded)")
+
+    def __getattr__(self, name):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, name)
+
+    @property
+    def loaded(self) -> bool:
+        return self._name in sys.modules
+
+
+class LazyClass(type):
+    """
+    Metaclass of the stand-ins of classes of lazily imported modules:
+    constructing a stand-in or getting its attributes (e.g. from_dict)
+    imports the module and goes to the actual class, while isinstance and
+    issubclass checks only do if the module is already imported, since no
+    instance can exist otherwise
+    """
+
+    def resolve(cls, load: bool = True):
+        module = cls._module
+        if not load and not module.loaded:
+            return None
+        return getattr(module, cls.__name__)
+
+    def __call__(cls, *args, **kwargs):
+        return cls.resolve()(*args, **kwargs)
+
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(cls.resolve(), name)
+
+    def __instancecheck__(cls, obj):
+        actual = cls.resolve(load=False)
+        return actual is not None and isinstance(obj, actual)
+
+    def __subclasscheck__(cls, subclass):
+        if subclass is cls:
+            return True
+        actual = cls.resolve(load=False)
+        return actual is not None and issubclass(subclass, actual)
+
+
+# dflow pulls in kubernetes and argo clients, it is only imported once an
+# S3 artifact is constructed, decoded, uploaded or downloaded
+dflow = LazyModule("dflow")
+
+
+class S3Artifact(metaclass=LazyClass):
+    """S3Artifact of dflow, see LazyClass"""
+    _module = dflow
+
+
+def upload_artifact(*args, **kwargs):
+    """upload_artifact of dflow"""
+    return dflow.upload_artifact(*args, **kwargs)
+
+
+def download_artifact(*args, **kwargs):
+    """download_artifact of dflow"""
+    return dflow.download_artifact(*args, **kwargs)
@@ -0,0 +1,240 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Union
+
+from .client import RegistryClient, get_default_client
+from .model import Dataset, Model, Reference, Resolver, iter_references
+from .paging import DEFAULT_PAGE_SIZE, iter_pages
+
+UPSTREAM = "upstream"
+DOWNSTREAM = "downstream"
+
+
+def node_key(entity) -> tuple:
+    if isinstance(entity, Reference):
+        return entity.kind, str(entity.id)
+    if getattr(entity, "id", None) is None:
+        raise ValueError("%s is not registered" % entity)
+    return type(entity), str(entity.id)
+
+
+def node_label(key: tuple) -> str:
+    return "%s:%s" % (key[0].__name__, key[1])
+
+
+class LineageGraph:
+    def __init__(self, root: tuple, direction: str = UPSTREAM) -> None:
+        """
+        Lineage graph of a model or dataset, built by upstream or
+        downstream
+
+        Args:
+            root: (class, id) of the entity the graph is built from
+            direction: upstream if edges lead from an entity to the ones it
+                was generated from (source and resources), downstream if
+                they lead to the ones generated from it
+
+        Nodes are keyed by (class, id) and hold the entities, whose own
+        references are Reference proxies that are resolved from the records
+        fetched for the graph.
+        """
+        self.root = root
+        self.direction = direction
+        self.nodes = {}
+        self.depths = {}
+        self.edges = {}
+        # referred but not found in the registry
+        self.missing = set()
+        # nodes at the depth limit, whose edges were not explored
+        self.truncated = set()
+
+    def __repr__(self):
+        return "<LineageGraph %s %s: %s nodes>" % (
+            self.direction, node_label(self.root), len(self.nodes))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, entity):
+        return node_key(entity) in self.nodes
+
+    def add_node(self, key: tuple, entity, depth: int) -> None:
+        self.nodes[key] = entity
+        self.depths[key] = depth
+
+    def levels(self) -> List[list]:
+        """Entities by distance to the root, the root first"""
+        levels = []
+        for key, depth in self.depths.items():
+            while len(levels) <= depth:
+                levels.append([])
+            levels[depth].append(self.nodes[key])
+        return levels
+
+    def adjacency(self) -> Dict[str, List[str]]:
+        """Adjacency lists of the graph, nodes labelled as Model:<id> and
+        Dataset:<id>"""
+        return {node_label(key): [node_label(k) for k in
+                                  self.edges.get(key, [])]
+                for key in self.nodes}
+
+    def cycles(self) -> List[List[tuple]]:
+        """Cycles of the graph, each as the list of its nodes starting and
+        ending with the same one"""
+        cycles = []
+        state = {}  # 1 while on the current path, 2 once explored
+        for start in self.nodes:
+            if start in state:
+                continue
+            path = [start]
+            state[start] = 1
+            stack = [iter(self.edges.get(start, []))]
+            while stack:
+                for key in stack[-1]:
+                    if state.get(key) == 1:
+                        cycles.append(path[path.index(key):] + [key])
+                    elif key not in state and key in self.nodes:
+                        state[key] = 1
+                        path.append(key)
+                        stack.append(iter(self.edges.get(key, [])))
+                        break
+                else:
+                    state[path.pop()] = 2
+                    stack.pop()
+        return cycles
+
+    @property
+    def is_dag(self) -> bool:
+        return not self.cycles()
+
+
+def upstream(entity: Union[Model, Dataset, Reference],
+             depth: int = None,
+             client: RegistryClient = None,
+             domain: str = None) -> LineageGraph:
+    """
+    Build the upstream lineage of a model or dataset: the entities it was
+    generated from, recursively
+
+    Args:
+        entity: registered model or dataset, or a reference to one
+        depth: maximum distance to the entity, unlimited by default
+        client: client used for fetching the entities
+        domain: domain of the registry
+
+    The graph is walked breadth-first, each frontier being fetched as one
+    concurrent batch and each entity once, so that resolving the graph
+    takes as many round trips as it is deep.
+    """
+    resolver = Resolver(client=client, domain=domain, lazy=True)
+    root = node_key(entity)
+    graph = LineageGraph(root, UPSTREAM)
+    if isinstance(entity, Reference):
+        resolver.fetch([root])
+        record = resolver.records.get(root)
+        if record is None:
+            raise LookupError("%s not found in the registry" % entity)
+        entity = resolver.build(root[0], record)
+    else:
+        resolver.records[root] = entity.to_dict()
+        resolver.objects[root] = entity
+    graph.add_node(root, entity, 0)
+    frontier = [root]
+    level = 0
+    while frontier:
+        if depth is not None and level >= depth:
+            graph.truncated.update(frontier)
+            break
+        level += 1
+        new = {}
+        for key in frontier:
+            refs = list(dict.fromkeys(iter_references(resolver.records[key])))
+            graph.edges[key] = refs
+            for ref in refs:
+                if ref not in graph.nodes:
+                    new[ref] = None
+        resolver.fetch(new)
+        frontier = []
+        for key in new:
+            record = resolver.records.get(key)
+            if record is None:
+                graph.missing.add(key)
+                continue
+            graph.add_node(key, resolver.build(key[0], record), level)
+            frontier.append(key)
+    return graph
+
+
+def downstream(entity: Union[Model, Dataset, Reference],
+               depth: int = None,
+               client: RegistryClient = None,
+               domain: str = None,
+               page_size: int = DEFAULT_PAGE_SIZE) -> LineageGraph:
+    """
+    Build the downstream lineage of a model or dataset: the entities
+    generated from it, recursively
+
+    Args:
+        entity: registered model or dataset, or a reference to one
+        depth: maximum distance to the entity, unlimited by default
+        client: client used for listing the entities
+        domain: domain of the registry
+        page_size: number of records per page of the listings
+
+    The registry cannot be queried by reference, so the models and
+    datasets are listed page by page to index who refers to whom, and the
+    graph is then walked breadth-first from the index: the number of round
+    trips depends on the size of the catalog, not on the graph.
+    """
+    client = client or get_default_client()
+    resolver = Resolver(client=client, domain=domain, lazy=True)
+    referrers = defaultdict(list)
+    for cls in [Model, Dataset]:
+        for lis in iter_pages(cls, {}, page_size=page_size, prefetch=True,
+                              domain=domain, client=client):
+            resolver.register(cls, lis)
+            for record in lis:
+                if record.get("id") is None:
+                    continue
+                key = (cls, str(record["id"]))
+                for ref in dict.fromkeys(iter_references(record)):
+                    referrers[ref].append(key)
+    root = node_key(entity)
+    graph = LineageGraph(root, DOWNSTREAM)
+    if isinstance(entity, Reference):
+        entity = resolver.get(*root)
+        if entity is None:
+            raise LookupError("%s not found in the registry" % node_label(
+                root))
+    graph.add_node(root, entity, 0)
+    frontier = [root]
+    level = 0
+    while frontier:
+        if depth is not None and level >= depth:
+            graph.truncated.update(frontier)
+            break
+        level += 1
+        new = []
+        for key in frontier:
+            graph.edges[key] = referrers.get(key, [])
+            for ref in graph.edges[key]:
+                if ref not in graph.nodes:
+                    graph.add_node(ref, resolver.build(
+                        ref[0], resolver.records[ref]), level)
+                    new.append(ref)
+        frontier = new
+    return graph
+
+
+def lineage(entity: Union[Model, Dataset, Reference],
+            direction: str = UPSTREAM,
+            depth: Optional[int] = None,
+            client: RegistryClient = None,
+            domain: str = None) -> LineageGraph:
+    """Build the upstream or downstream lineage of a model or dataset, see
+    upstream and downstream"""
+    if direction == UPSTREAM:
+        return upstream(entity, depth=depth, client=client, domain=domain)
+    elif direction == DOWNSTREAM:
+        return downstream(entity, depth=depth, client=client, domain=domain)
+    raise ValueError("direction should be %s or %s, got %s"
+                     % (UPSTREAM, DOWNSTREAM, direction))
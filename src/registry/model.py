@@ -1,35 +1,607 @@
-import json
-from typing import Dict, List, Union
-
-import requests
-from dflow import S3Artifact, upload_artifact
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from .aio import AsyncRegistryClient, get_default_async_client
 from .artifacts import Artifact, GitArtifact, HTTPArtifact, LocalPath
-
-test_domain = "http://registration-center.test.dp.tech"
+from .bulk import (DEFAULT_CONCURRENCY, InsertResult, QueryResult,
+                   fetch_many, insert_many)
+from .client import DEFAULT_DOMAIN, RegistryClient, get_default_client
+from .download import Downloader, get_default_downloader
+from .instrumentation import span
+from .lazy import S3Artifact, upload_artifact
+from .paging import DEFAULT_PAGE_SIZE, iter_pages
+from .schema import Entity, decode_item, encode_item, register_artifact
+from .upload import (DEFAULT_UPLOAD_WORKERS, UploadIndex,
+                     upload_local_artifacts)
+
+test_domain = DEFAULT_DOMAIN
+
+artifact_fields = ["location", "code", "source", "resources"]
+# always loaded by projections, to identify the entities and load the rest
+identity_fields = ("id", "namespace", "name", "version")
+# records of a streamed response decoded together, their references fetched
+# in one batch
+DEFAULT_STREAM_WINDOW = 32
 
 
 def obj_to_dict(obj):
-    if isinstance(obj, Artifact):
-        return obj.to_dict()
-    elif isinstance(obj, S3Artifact):
-        return {"s3": obj.to_dict()}
-    elif isinstance(obj, Model):
-        return {"model": {"id": obj.id}}
-    elif isinstance(obj, Dataset):
-        return {"dataset": {"id": obj.id}}
+    return encode_item(obj)
+
+
+def obj_from_dict(d, resolver: "Resolver" = None):
+    return decode_item(d, resolver)
+
+
+def projection(cls, fields: Optional[Iterable[str]]) -> Optional[frozenset]:
+    """Fields of cls to load, along with identity_fields, None for all"""
+    if fields is None:
+        return None
+    fields = frozenset(fields)
+    unknown = fields.difference(cls._fields)
+    if unknown:
+        raise ValueError("unknown fields of %s: %s" % (
+            cls.__name__, ", ".join(sorted(unknown))))
+    return fields.union(identity_fields)
+
+
+def fields_param(fields: Optional[frozenset]) -> Optional[str]:
+    return ",".join(sorted(fields)) if fields is not None else None
+
+
+def query_many(cls,
+               ids: List[str] = None,
+               keys: List[Tuple[str, str, str]] = None,
+               concurrency: int = None,
+               domain: str = None,
+               client: RegistryClient = None,
+               lazy: bool = False) -> List[QueryResult]:
+    """
+    Look up many entities of a class by id or by (namespace, name, version)
+    key, see fetch_many
+
+    Returns a result per id or key, in their order, the entity being shared
+    by duplicates. The models and datasets referred by the entities found
+    are resolved together.
+    """
+    client = client or get_default_client()
+    lookups, results = fetch_many(cls, ids=ids, keys=keys,
+                                  concurrency=concurrency, domain=domain,
+                                  client=client)
+    found = [lookup for lookup in lookups if isinstance(results[lookup], dict)]
+    records = [results[lookup] for lookup in found]
+    entities = Resolver(client=client, domain=domain,
+                        lazy=lazy).load(cls, records)
+    entities = dict(zip(found, entities))
+    requested = [str(id) for id in ids] if ids is not None else \
+        [tuple(key) for key in keys]
+    return [QueryResult(lookup, entities.get(lookup),
+                        results[lookup] if isinstance(results[lookup],
+                                                      Exception) else None)
+            for lookup in requested]
+
+
+def iter_references(record: dict, fields: frozenset = None):
+    """Yield (class, id) of the models and datasets referred by a record,
+    only by the given fields if any"""
+    for key in artifact_fields:
+        if fields is not None and key not in fields:
+            continue
+        value = record.get(key)
+        if not value:
+            continue
+        if "dict" in value:
+            items = value["dict"].values()
+        elif "list" in value:
+            items = value["list"]
+        else:
+            items = [value]
+        for i in items:
+            if not isinstance(i, dict):
+                continue
+            if "model" in i:
+                yield Model, str(i["model"]["id"])
+            elif "dataset" in i:
+                yield Dataset, str(i["dataset"]["id"])
+
+
+class Reference:
+    __slots__ = ("kind", "id", "_resolver", "_target")
+
+    def __init__(self, kind, id, resolver: "Resolver" = None) -> None:
+        """
+        Proxy of a referred model or dataset, which is fetched on the first
+        access to any of its attributes other than kind and id
 
+        Args:
+            kind: Model or Dataset
+            id: id of the referred entity
+            resolver: resolver used for fetching the entity
+        """
+        self.kind = kind
+        self.id = id
+        self._resolver = resolver
+        self._target = None
 
-def obj_from_dict(d):
-    if "model" in d:
-        return Model.query(id=d["model"]["id"])
-    if "dataset" in d:
-        return Dataset.query(id=d["dataset"]["id"])
-    else:
-        return Artifact.from_dict(d)
+    def __repr__(self):
+        return "<Reference %s:%s>" % (self.kind.__name__, self.id)
 
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
 
-class Model:
+    def resolve(self):
+        if self._target is None:
+            resolver = self._resolver or Resolver()
+            self._target = resolver.get(self.kind, self.id)
+            if self._target is None:
+                raise LookupError("%s not found in the registry" % self)
+        return self._target
+
+    def to_dict(self):
+        key = "model" if self.kind is Model else "dataset"
+        return {key: {"id": self.id}}
+
+
+class Deferred:
+    def __init__(self,
+                 client: RegistryClient,
+                 domain: str = None,
+                 lazy: bool = False) -> None:
+        """
+        Loader of the fields left out by a projection, fetching the whole
+        record of an entity in one request on the first access to any of
+        them, see Entity.__getattr__
+
+        Args:
+            client: client used for fetching the records
+            domain: domain of the registry
+            lazy: refer to models and datasets by Reference proxies
+        """
+        self.client = client
+        self.domain = domain
+        self.lazy = lazy
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Deferred>"
+
+    def load(self, obj) -> None:
+        with self.lock:
+            if getattr(obj, "_deferred", None) is None:
+                # loaded by another thread meanwhile
+                return
+            cls = type(obj)
+            resolver = Resolver(client=self.client, domain=self.domain,
+                                lazy=self.lazy)
+            full = resolver.get(cls, obj.id)
+            obj._deferred = None
+            if full is None:
+                raise LookupError("%s:%s not found in the registry" % (
+                    cls.__name__, obj.id))
+            for f in cls._fields:
+                try:
+                    object.__getattribute__(obj, f)
+                except AttributeError:
+                    setattr(obj, f, getattr(full, f))
+
+
+class Resolver:
+    def __init__(self,
+                 client: RegistryClient = None,
+                 domain: str = None,
+                 lazy: bool = False) -> None:
+        """
+        Resolver of the models and datasets referred by records, which
+        fetches all references of a level in one concurrent batch and
+        fetches each distinct id only once
+
+        Args:
+            client: client used for fetching references
+            domain: domain of the registry
+            lazy: refer to models and datasets by Reference proxies instead
+                of fetching them
+        """
+        self.client = client or get_default_client()
+        self.domain = domain
+        self.lazy = lazy
+        self.records = {}
+        self.objects = {}
+        self.deferred = Deferred(self.client, domain, lazy)
+
+    def load(self, cls, records: List[dict], fields: frozenset = None) -> list:
+        """
+        Entities of records, with the models and datasets they refer to
+
+        Args:
+            cls: class of the entities
+            records: records of the entities
+            fields: projection of the fields to decode (see projection),
+                the others are loaded on first access
+        """
+        with span("from_dict", entity=cls.__name__, records=len(records)):
+            if fields is None:
+                # partial records must not be built as referred entities
+                self.register(cls, records)
+            if not self.lazy:
+                self.prefetch(self.references(cls, records, fields))
+            return [self.build(cls, record, fields) for record in records]
+
+    def stream(self, cls, records: Iterable[dict],
+               fields: frozenset = None,
+               window: int = DEFAULT_STREAM_WINDOW) -> Iterator:
+        """Same as load, by windows of records whose references are
+        fetched in one batch, only keeping the entities of the current
+        window"""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= window:
+                yield from self.load_window(cls, batch, fields)
+                batch = []
+        if batch:
+            yield from self.load_window(cls, batch, fields)
+
+    def load_window(self, cls, records: List[dict],
+                    fields: frozenset = None) -> Iterator:
+        yield from self.load(cls, records, fields)
+        # referred by the entities yielded, fetched again if referred later
+        self.records.clear()
+        self.objects.clear()
+
+    @staticmethod
+    def references(cls, records: Iterable[dict],
+                   fields: frozenset = None) -> list:
+        """(class, id) of the models and datasets referred by records of
+        cls, none unless cls has artifact fields"""
+        if not cls._artifact_fields:
+            return []
+        return [ref for record in records if record is not None
+                for ref in iter_references(record, fields)]
+
+    def register(self, cls, records: List[dict]) -> None:
+        for record in records:
+            if record.get("id") is not None:
+                self.records.setdefault((cls, str(record["id"])), record)
+
+    def missing(self, keys) -> list:
+        return [key for key in set(keys) if key not in self.records]
+
+    def get(self, cls, id):
+        key = (cls, str(id))
+        if key not in self.objects:
+            self.prefetch([key])
+            if self.records.get(key) is None:
+                return None
+            return self.build(cls, self.records[key])
+        return self.objects[key]
+
+    def lookup(self, cls, id):
+        if self.lazy:
+            return Reference(cls, id, self)
+        return self.get(cls, id)
+
+    def prefetch(self, keys: list) -> None:
+        keys = set(keys)
+        if self.lazy:
+            self.fetch(keys)
+            return
+        while keys:
+            keys = self.missing(keys)
+            self.fetch(keys)
+            keys = set(ref for key in keys for ref in self.references(
+                key[0], [self.records.get(key)]))
+
+    def fetch(self, keys) -> list:
+        keys = self.missing(keys)
+        if not keys:
+            return []
+        workers = min(len(keys), self.client.pool_maxsize)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            records = list(executor.map(self.fetch_one, keys))
+        for key, record in zip(keys, records):
+            self.records[key] = record
+        return records
+
+    def fetch_one(self, key):
+        cls, id = key
+        d = self.client.get(cls._endpoint, params={"id": id},
+                            domain=self.domain)
+        if d is None:
+            return None
+        lis = (d.get("data") or {}).get(cls._list_key) or []
+        return lis[0] if lis else None
+
+    def build(self, cls, record: dict, fields: frozenset = None):
+        key = None
+        if record.get("id") is not None:
+            key = (cls, str(record["id"]))
+            if key in self.objects:
+                return self.objects[key]
+        obj = cls._codec.decoder(fields)(record)
+        if fields is not None:
+            obj._deferred = self.deferred
+        if key is not None:
+            # registered before decoding the artifacts to tolerate cycles
+            self.objects[key] = obj
+        for k in cls._codec.artifact_fields:
+            if fields is not None and k not in fields:
+                continue
+            value = record.get(k)
+            if value:
+                setattr(obj, k, self.decode(value))
+        return obj
+
+    async def aload(self,
+                    cls,
+                    records: List[dict],
+                    client: AsyncRegistryClient,
+                    fields: frozenset = None) -> list:
+        """Same as load, fetching the references with an asynchronous
+        client; Reference proxies of the lazy mode and deferred fields are
+        still fetched with the synchronous client"""
+        if fields is None:
+            self.register(cls, records)
+        if not self.lazy:
+            keys = self.missing(self.references(cls, records, fields))
+            while keys:
+                fetched = await asyncio.gather(
+                    *[self.afetch_one(key, client) for key in keys])
+                for key, record in zip(keys, fetched):
+                    self.records[key] = record
+                keys = self.missing(ref for record in fetched
+                                    if record is not None
+                                    for ref in iter_references(record))
+        with span("from_dict", entity=cls.__name__, records=len(records)):
+            return [self.build(cls, record, fields) for record in records]
+
+    async def afetch_one(self, key, client: AsyncRegistryClient):
+        cls, id = key
+        d = await client.get(cls._endpoint, params={"id": id},
+                             domain=self.domain)
+        if d is None:
+            return None
+        lis = (d.get("data") or {}).get(cls._list_key) or []
+        return lis[0] if lis else None
+
+    def decode(self, value):
+        if not value:
+            return None
+        elif "dict" in value:
+            return {k: decode_item(v, self)
+                    for k, v in value["dict"].items()}
+        elif "list" in value:
+            return [decode_item(i, self) for i in value["list"]]
+        else:
+            return decode_item(value, self)
+
+
+def download_each(entities: Iterable["ArtifactEntity"],
+                  dest: str = None) -> Iterator["ArtifactEntity"]:
+    """Download each entity to its own namespace/name/version (under dest
+    if provided), yielding them once downloaded"""
+    for entity in entities:
+        entity.download(None if dest is None else os.path.join(
+            dest, entity.namespace, entity.name, entity.version))
+        yield entity
+
+
+def identified(record: dict) -> bool:
+    """Whether a record holds the namespace, name and version of an entity,
+    queries skipping the records missing any"""
+    return "namespace" in record and "name" in record and "version" in record
+
+
+class RegistryEntity(Entity):
+    """
+    Base of the entities registered at and queried from their _endpoint
+
+    Subclasses list in _upload_fields the fields whose local paths are
+    uploaded before the entity is registered.
+    """
+    __slots__ = ()
+    _upload_fields = ()
+
+    @classmethod
+    def from_dict(cls,
+                  d: dict,
+                  client: RegistryClient = None,
+                  domain: str = None,
+                  lazy: bool = False):
+        return cls.from_dict_list([d], client=client, domain=domain,
+                                  lazy=lazy)[0]
+
+    @classmethod
+    def from_dict_list(cls,
+                       lis: List[dict],
+                       client: RegistryClient = None,
+                       domain: str = None,
+                       lazy: bool = False,
+                       fields: List[str] = None) -> list:
+        return Resolver(client=client, domain=domain, lazy=lazy).load(
+            cls, lis, projection(cls, fields))
+
+    def upload_local_paths(self, keys, client: RegistryClient) -> None:
+        upload_local_artifacts(self, keys, max_workers=client.upload_workers,
+                               index=client.upload_index,
+                               upload=client.multipart or upload_artifact)
+
+    def checked_dict(self) -> dict:
+        """to_dict, once checked that the entity can be registered"""
+        return self.to_dict()
+
+    def insert_body(self, client: RegistryClient = None) -> dict:
+        client = client or get_default_client()
+        self.upload_local_paths(self._upload_fields, client)
+        return self.checked_dict()
+
+    def register(self, body: dict, domain: str,
+                 client: RegistryClient) -> Optional[dict]:
+        data = client.post(self._endpoint, body, domain=domain)
+        if data is not None:
+            self.id = data.get("id", "")
+        return data
+
+    async def aregister(self, body: dict, domain: str,
+                        client: AsyncRegistryClient) -> Optional[dict]:
+        data = await client.post(self._endpoint, body, domain=domain)
+        if data is not None:
+            self.id = data.get("id", "")
+        return data
+
+    def insert(self,
+               domain: str = None,
+               upload: bool = False,
+               client: RegistryClient = None):
+        """
+        Register the entity, setting its id once registered
+
+        Args:
+            domain: domain of the registry
+            upload: upload the local paths of an OP once registered, those
+                of the other entities being uploaded before anyway
+            client: client used
+        """
+        client = client or get_default_client()
+        self.register(self.insert_body(client), domain, client)
+
+    @classmethod
+    def insert_many(cls,
+                    entities: list,
+                    concurrency: int = DEFAULT_CONCURRENCY,
+                    domain: str = None,
+                    client: RegistryClient = None) -> List[InsertResult]:
+        return insert_many(cls, entities, concurrency=concurrency,
+                           domain=domain, client=client)
+
+    async def ainsert(self,
+                      domain: str = None,
+                      upload: bool = False,
+                      client: AsyncRegistryClient = None):
+        client = client or get_default_async_client()
+        await client.upload_local_artifacts(self, self._upload_fields)
+        await self.aregister(self.checked_dict(), domain, client)
+
+    @classmethod
+    def query(cls,
+              namespace: str = None,
+              name: str = None,
+              version: str = None,
+              domain: str = None,
+              id: str = None,
+              client: RegistryClient = None,
+              lazy: bool = False,
+              stream: bool = False,
+              fields: List[str] = None) -> Union[list, Iterator]:
+        """
+        Entities matching, None if the query failed
+
+        Args:
+            lazy: refer to models and datasets by Reference proxies
+            stream: decode the records while the response is received
+            fields: only load these fields (along with id, namespace, name
+                and version), asking the registry for them only; the others
+                are fetched in one request per entity on first access
+        """
+        path = cls._endpoint
+        fields = projection(cls, fields)
+        d = {"namespace": namespace, "name": name, "version": version,
+             "id": id, "fields": fields_param(fields)}
+        client = client or get_default_client()
+        if stream:
+            records = client.iter_records(path, d, cls._list_key,
+                                          domain=domain)
+            return Resolver(client=client, domain=domain, lazy=lazy).stream(
+                cls, (r for r in records if identified(r)), fields)
+
+        def parse(d):
+            lis = d.get("data", {}).get(cls._list_key) or []
+            return cls.from_dict_list([r for r in lis if identified(r)],
+                                      client=client, domain=domain,
+                                      lazy=lazy, fields=fields)
+        return client.get_parsed(path, d, parse, domain=domain,
+                                 variant=(cls, lazy, fields))
+
+    @classmethod
+    async def aquery(cls,
+                     namespace: str = None,
+                     name: str = None,
+                     version: str = None,
+                     domain: str = None,
+                     id: str = None,
+                     client: AsyncRegistryClient = None,
+                     lazy: bool = False,
+                     fields: List[str] = None) -> list:
+        client = client or get_default_async_client()
+        fields = projection(cls, fields)
+        d = {"namespace": namespace, "name": name, "version": version,
+             "id": id, "fields": fields_param(fields)}
+        d = await client.get(cls._endpoint, params=d, domain=domain)
+        if d is None:
+            return
+        lis = d.get("data", {}).get(cls._list_key) or []
+        resolver = Resolver(domain=domain or client.domain, lazy=lazy)
+        return await resolver.aload(cls, [r for r in lis if identified(r)],
+                                    client, fields)
+
+    @classmethod
+    def query_many(cls,
+                   ids: List[str] = None,
+                   keys: List[Tuple[str, str, str]] = None,
+                   domain: str = None,
+                   client: RegistryClient = None,
+                   lazy: bool = False,
+                   concurrency: int = None) -> List[QueryResult]:
+        """
+        Look up many entities at once, by ids or by (namespace, name,
+        version) keys, e.g.
+
+            for r in Model.query_many(keys=[("ns", "name", "v1"), ...]):
+                if r.entity is None:
+                    print("%s not found" % (r.key, ))
+
+        Distinct lookups are made concurrently, or by batches if the client
+        has query_batch_size set, see fetch_many.
+        """
+        return query_many(cls, ids=ids, keys=keys, concurrency=concurrency,
+                          domain=domain, client=client, lazy=lazy)
+
+    @classmethod
+    def iter_query(cls,
+                   namespace: str = None,
+                   name: str = None,
+                   version: str = None,
+                   domain: str = None,
+                   id: str = None,
+                   client: RegistryClient = None,
+                   lazy: bool = False,
+                   page_size: int = DEFAULT_PAGE_SIZE,
+                   prefetch: bool = False,
+                   fields: List[str] = None) -> Iterator["RegistryEntity"]:
+        """Same as query, iterating over the results page by page, see
+        iter_pages"""
+        fields = projection(cls, fields)
+        d = {"namespace": namespace, "name": name, "version": version,
+             "id": id, "fields": fields_param(fields)}
+        for lis in iter_pages(cls, d, page_size=page_size, prefetch=prefetch,
+                              domain=domain, client=client):
+            yield from cls.from_dict_list([r for r in lis if identified(r)],
+                                          client=client, domain=domain,
+                                          lazy=lazy, fields=fields)
+
+
+class ArtifactEntity(RegistryEntity):
+    """
+    Base of Model and Dataset, entities whose location is an artifact
+    """
+    __slots__ = ("namespace", "name", "description", "readme", "author",
+                 "version", "labels", "status", "size", "location", "code",
+                 "source", "parameters", "spec", "resources", "id")
+    _artifact_fields = tuple(artifact_fields)
+    _upload_fields = tuple(artifact_fields)
 
     def __init__(self,
                  namespace: str,
@@ -64,7 +636,7 @@ class Model:
                  **kwargs,
                  ) -> None:
         """
-        Model
+        Model or dataset
 
         Args:
             namespace: namespace
@@ -77,11 +649,11 @@ class Model:
             status: status
             size: artifact size
             location: storage location, either locally or remotely
-            code: source code used for generating the model
-            source: artifacts used for generating the model
-            parameters: parameters used for generating the model
-            spec: specification of the model
-            resources: related artifacts of the model
+            code: source code used for generating the artifact
+            source: artifacts used for generating the artifact
+            parameters: parameters used for generating the artifact
+            spec: specification of the artifact
+            resources: related artifacts
         """
         self.namespace = namespace
         self.name = name
@@ -99,255 +671,110 @@ class Model:
         self.spec = spec
         self.resources = resources
         self.id = id
+        self._extra = None
 
-    def __repr__(self):
-        return "<Model %s/%s:%s>" % (self.namespace, self.name, self.version)
+    def handle_local_artifacts(self,
+                               max_workers: int = DEFAULT_UPLOAD_WORKERS,
+                               index: UploadIndex = None,
+                               upload=upload_artifact):
+        upload_local_artifacts(self, artifact_fields, max_workers=max_workers,
+                               upload=upload, index=index)
 
-    def to_dict(self):
-        d = {}
-        for key, value in self.__dict__.items():
-            if key in ["location", "code", "source", "resources"]:
-                if value is None:
-                    d[key] = None
-                elif isinstance(value, (Artifact, S3Artifact, Model, Dataset)):
-                    d[key] = obj_to_dict(value)
-                elif isinstance(value, dict):
-                    d[key] = {"dict":
-                              {k: obj_to_dict(v) for k, v in value.items()}}
-                elif isinstance(value, list):
-                    d[key] = {"list": [obj_to_dict(i) for i in value]}
-                else:
-                    raise TypeError("%s is not supported artifact"
-                                    % type(value))
-            else:
-                d[key] = value
-        return d
+    def download(self, dest: str = None, downloader: Downloader = None):
+        """
+        Download the location of the entity
 
-    @classmethod
-    def from_dict(cls, d):
-        kwargs = {}
-        for key, value in d.items():
-            if key in ["location", "code", "source", "resources"]:
-                if not value:
-                    kwargs[key] = None
-                elif "dict" in value:
-                    kwargs[key] = {k: obj_from_dict(v) for k, v in
-                                   value["dict"].items()}
-                elif "list" in value:
-                    kwargs[key] = [obj_from_dict(i) for i in value["list"]]
-                else:
-                    kwargs[key] = obj_from_dict(value)
-            else:
-                kwargs[key] = value
-        return cls(**kwargs)
-
-    def handle_local_artifacts(self):
-        for key in ["location", "code", "source", "resources"]:
-            value = getattr(self, key)
-            print(key, value)
-            if isinstance(value, LocalPath):
-                setattr(self, key, upload_artifact(value.path))
-            elif isinstance(value, dict):
-                for k, v in value.items():
-                    if isinstance(v, LocalPath):
-                        value[k] = upload_artifact(v.path)
-            elif isinstance(value, list):
-                for i, v in enumerate(value):
-                    if isinstance(v, LocalPath):
-                        value[i] = upload_artifact(v.path)
+        Args:
+            dest: destination directory, namespace/name/version under the
+                current directory by default
+            downloader: downloader used, the default one if not provided
 
-    def insert(self,
-               domain: str = test_domain):
-        self.handle_local_artifacts()
-        url = domain + "/api/v1/model"
+        Returns the local path(s) in the same form as location.
+        """
+        if self.location is None:
+            raise ValueError("Location of %s not provided" % self)
+        if dest is None:
+            dest = os.path.join(self.namespace, self.name, self.version)
+        downloader = downloader or get_default_downloader()
+        return downloader.download(self.location, dest)
+
+    def checked_dict(self) -> dict:
         body = self.to_dict()
         if body["location"] is None:
             raise ValueError("Location of %s not provided" % self)
-        r = requests.post(url=url, data=json.dumps(body))
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
-            return
-        body = r.json()
-        if body.get("code", 1) != 0:
-            print(body.get("error", "got error but no error set"))
-            return
-        data = body.get("data", {})
-        self.id = data.get("id", "")
+        return body
 
     @classmethod
     def query(cls,
               namespace: str = None,
               name: str = None,
               version: str = None,
-              domain: str = test_domain,
-              id: str = None) -> list:
-        url = domain + "/api/v1/model"
-        d = {"namespace": namespace, "name": name, "version": version,
-             "id": id}
-        r = requests.get(url=url, params=d)
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
-            return
-        d = r.json()
-        lis = d.get("data", {}).get("models", [])
-        if lis is None:
-            return []
-        res = []
-        for mod in lis:
-            m = cls.from_dict(mod)
-            res.append(m)
+              domain: str = None,
+              id: str = None,
+              client: RegistryClient = None,
+              lazy: bool = False,
+              stream: bool = False,
+              fields: List[str] = None,
+              down_load: bool = False,
+              dest: str = None) -> Union[list, Iterator]:
+        """Same as RegistryEntity.query, downloading each entity if
+        down_load, under dest if provided, see download_each"""
+        res = super().query(namespace, name, version, domain, id, client,
+                            lazy, stream, fields)
+        if not down_load or res is None:
+            return res
+        if stream:
+            return download_each(res, dest)
+        for _ in download_each(res, dest):
+            pass
         return res
 
 
-class Dataset:
-
-    def __init__(self,
-                 namespace: str,
-                 name: str,
-                 version: str,
-                 description: str = None,
-                 readme: str = None,
-                 author: str = None,
-                 labels: Dict[str, str] = None,
-                 status: str = None,
-                 size: int = None,
-                 id: str = None,
-                 location: Union[HTTPArtifact, LocalPath, S3Artifact,
-                                 Dict[str, Union[LocalPath,
-                                                 S3Artifact, HTTPArtifact]],
-                                 List[Union[LocalPath, S3Artifact,
-                                            HTTPArtifact]]] = None,
-                 code: GitArtifact = None,
-                 source: Union[HTTPArtifact, LocalPath, S3Artifact, "Dataset",
-                               Dict[str, Union[HTTPArtifact, LocalPath,
-                                               S3Artifact, "Dataset"]],
-                               List[Union[HTTPArtifact, LocalPath,
-                                          S3Artifact, "Dataset"]]] = None,
-                 parameters: Union[dict, LocalPath] = None,
-                 spec: Union[dict, LocalPath] = None,
-                 resources: Union[HTTPArtifact, LocalPath, S3Artifact,
-                                  "Dataset",
-                                  Dict[str, Union[HTTPArtifact, LocalPath,
-                                                  S3Artifact, "Dataset"]],
-                                  List[Union[HTTPArtifact, LocalPath,
-                                             S3Artifact, "Dataset"]]] = None,
-                 **kwargs,
-                 ) -> None:
-        self.namespace = namespace
-        self.name = name
-        self.description = description
-        self.readme = readme
-        self.author = author
-        self.version = version
-        self.labels = labels
-        self.status = status
-        self.size = size
-        self.location = location
-        self.code = code
-        self.source = source
-        self.parameters = parameters
-        self.spec = spec
-        self.resources = resources
-        self.id = id
+class Model(ArtifactEntity):
+    __slots__ = ()
+    _endpoint = "/api/v1/model"
+    _list_key = "models"
 
     def __repr__(self):
-        return "<Dataset %s/%s:%s>" % (self.namespace, self.name, self.version)
+        return "<Model %s/%s:%s>" % (self.namespace, self.name, self.version)
 
-    def to_dict(self):
-        d = {}
-        for key, value in self.__dict__.items():
-            if key in ["location", "code", "source", "resources"]:
-                if value is None:
-                    d[key] = None
-                elif isinstance(value, (Artifact, S3Artifact, Model, Dataset)):
-                    d[key] = obj_to_dict(value)
-                elif isinstance(value, dict):
-                    d[key] = {"dict":
-                              {k: obj_to_dict(v) for k, v in value.items()}}
-                elif isinstance(value, list):
-                    d[key] = {"list": [obj_to_dict(i) for i in value]}
-                else:
-                    raise TypeError("%s is not supported artifact"
-                                    % type(value))
-            else:
-                d[key] = value
-        return d
 
-    @classmethod
-    def from_dict(cls, d):
-        kwargs = {}
-        for key, value in d.items():
-            if key in ["location", "code", "source", "resources"]:
-                if not value:
-                    kwargs[key] = None
-                elif "dict" in value:
-                    kwargs[key] = {k: obj_from_dict(v) for k, v in
-                                   value["dict"].items()}
-                elif "list" in value:
-                    kwargs[key] = [obj_from_dict(i) for i in value["list"]]
-                else:
-                    kwargs[key] = obj_from_dict(value)
-            else:
-                kwargs[key] = value
-        return cls(**kwargs)
-
-    def handle_local_artifacts(self):
-        for key in ["location", "code", "source", "resources"]:
-            value = getattr(self, key)
-            if isinstance(value, LocalPath):
-                setattr(self, key, upload_artifact(value.path))
-            elif isinstance(value, dict):
-                for k, v in value.items():
-                    if isinstance(v, LocalPath):
-                        value[k] = upload_artifact(v.path)
-            elif isinstance(value, list):
-                for i, v in enumerate(value):
-                    if isinstance(v, LocalPath):
-                        value[i] = upload_artifact(v.path)
+class Dataset(ArtifactEntity):
+    __slots__ = ()
+    _endpoint = "/api/v1/data"
+    _list_key = "data"
 
-    def insert(self,
-               domain: str = test_domain):
-        self.handle_local_artifacts()
-        url = domain + "/api/v1/data"
-        body = self.to_dict()
-        if body["location"] is None:
-            raise ValueError("Location of %s not provided" % self)
-        r = requests.post(url=url, data=json.dumps(body))
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
-            return
-        body = r.json()
-        if body.get("code", 1) != 0:
-            print(body.get("error", "got error but no error set"))
-            return
-        data = body.get("data", {})
-        self.id = data.get("id", "")
+    def __repr__(self):
+        return "<Dataset %s/%s:%s>" % (self.namespace, self.name, self.version)
 
     @classmethod
     def query(cls,
               namespace: str = None,
               name: str = None,
               version: str = None,
-              domain: str = test_domain,
+              domain: str = None,
               down_load: bool = False,
-              id: int = None) -> list:
-        url = domain + "/api/v1/data"
-        d = {"namespace": namespace, "name": name, "version": version,
-             "id": id}
-        r = requests.get(url=url, params=d)
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
-            return
-        d = r.json()
-        lis = d.get("data", {}).get("data", [])
-        res = []
-        for data in lis:
-            d = cls.from_dict(data)
-            res.append(d)
-        return res
-
-
-class Workflow:
+              id: str = None,
+              client: RegistryClient = None,
+              lazy: bool = False,
+              dest: str = None,
+              stream: bool = False,
+              fields: List[str] = None) -> Union[list, Iterator]:
+        """Same as ArtifactEntity.query, down_load following domain as it
+        always has for datasets"""
+        return super().query(namespace, name, version, domain, id, client,
+                             lazy, stream, fields, down_load=down_load,
+                             dest=dest)
+
+
+class Workflow(RegistryEntity):
+    __slots__ = ("namespace", "name", "description", "readme", "author",
+                 "version", "labels", "status", "code", "python_package",
+                 "docker_image", "id")
+    _endpoint = "/api/v1/workflow"
+    _list_key = "workflows"
+    _keep_extra = True
+    _upload_fields = __slots__
 
     def __init__(self,
                  namespace: str,
@@ -374,62 +801,16 @@ class Workflow:
         self.python_package = python_package
         self.docker_image = docker_image
         self.id = id
-
-    def insert(self,
-               domain: str = test_domain,
-               upload: bool = False):
-        url = domain + "/api/v1/workflow"
-        d = self.__dict__
-        for k in d:
-            if isinstance(d[k], LocalPath):
-                self.__setattr__(k, upload_artifact(d[k].path))
-        body = {
-            key: d[key]
-            for key in d if "__" not in key and key is not None
-        }
-        r = requests.post(url=url, data=json.dumps(body))
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
-            return
-        body = r.json()
-        if body.get("code", 1) != 0:
-            print(body.get("error", "got error but no error set"))
-            return
-        data = body.get("data", {})
-        self.id = data.get("id", "")
-
-    @classmethod
-    def query(cls,
-              namespace: str = None,
-              name: str = None,
-              version: str = None,
-              domain: str = test_domain,
-              id: str = None) -> list:
-        url = domain + "/api/v1/workflow"
-        d = {"namespace": namespace, "name": name, "version": version,
-             "id": id}
-        r = requests.get(url=url, params=d)
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
-            return
-        d = r.json()
-        lis = d.get("data", {}).get("workflows", [])
-        res = []
-        for wf in lis:
-            try:
-                name = wf["name"]
-                namespace = wf["namespace"]
-                version = wf["version"]
-            except KeyError:
-                continue
-            w = cls(namespace, name, version)
-            for k in wf:
-                w.__setattr__(k, wf[k])
-            res.append(w)
-        return res
+        self._extra = None
 
 
-class OP:
+class OP(RegistryEntity):
+    __slots__ = ("namespace", "name", "description", "readme", "author",
+                 "version", "labels", "status", "code", "python_package",
+                 "docker_image", "inputs", "outputs", "execute", "id")
+    _endpoint = "/api/v1/OP"
+    _list_key = "OPs"
+    _keep_extra = True
 
     def __init__(self,
                  namespace: str,
@@ -462,58 +843,40 @@ class OP:
         self.outputs = outputs
         self.execute = execute
         self.id = id
+        self._extra = None
 
     def insert(self,
-               domain: str = test_domain,
-               upload: bool = False):
-        url = domain + "/api/v1/OP"
-        d = self.__dict__
-        body = {
-            key: d[key]
-            for key in d if "__" not in key and key is not None
-        }
-        r = requests.post(url=url, data=json.dumps(body))
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
+               domain: str = None,
+               upload: bool = False,
+               client: RegistryClient = None):
+        client = client or get_default_client()
+        if self.register(self.insert_body(client), domain, client) is None:
             return
-        body = r.json()
-        if body.get("code", 1) != 0:
-            print(body.get("error", "got error but no error set"))
-            return
-        data = body.get("data", {})
-        self.id = data.get("id", "")
         if upload:
-            d = self.__dict__
-            for k in d:
-                if isinstance(d[k], LocalPath):
-                    self.__setattr__(k, upload_artifact(d[k].path))
-
-    @classmethod
-    def query(cls,
-              namespace: str = None,
-              name: str = None,
-              version: str = None,
-              domain: str = test_domain,
-              id: str = None) -> list:
-        url = domain + "/api/v1/OP"
-        d = {"namespace": namespace, "name": name, "version": version,
-             "id": id}
-        r = requests.get(url=url, params=d)
-        if r.status_code < 200 or r.status_code >= 300:
-            print("got unexcept http status:", r.status_code)
+            self.upload_local_paths(self._fields, client)
+
+    async def ainsert(self,
+                      domain: str = None,
+                      upload: bool = False,
+                      client: AsyncRegistryClient = None):
+        client = client or get_default_async_client()
+        if await self.aregister(self.to_dict(), domain, client) is None:
             return
-        d = r.json()
-        lis = d.get("data", {}).get("OPs", [])
-        res = []
-        for op in lis:
-            try:
-                name = op["name"]
-                namespace = op["namespace"]
-                version = op["version"]
-            except KeyError:
-                continue
-            o = cls(namespace, name, version)
-            for k in op:
-                o.__setattr__(k, op[k])
-            res.append(o)
-        return res
+        if upload:
+            await client.upload_local_artifacts(self, self._fields)
+
+
+register_artifact(Reference, Reference.to_dict)
+register_artifact(HTTPArtifact, HTTPArtifact.to_dict, "http",
+                  lambda d, resolver: HTTPArtifact(**d))
+register_artifact(GitArtifact, GitArtifact.to_dict, "git",
+                  lambda d, resolver: GitArtifact(**d))
+register_artifact(Artifact, lambda a: a.to_dict())
+register_artifact(S3Artifact, lambda a: {"s3": a.to_dict()}, "s3",
+                  lambda d, resolver: S3Artifact.from_dict(d))
+register_artifact(Model, lambda m: {"model": {"id": m.id}}, "model",
+                  lambda d, resolver: (resolver or Resolver()).lookup(
+                      Model, d["id"]))
+register_artifact(Dataset, lambda d: {"dataset": {"id": d.id}}, "dataset",
+                  lambda d, resolver: (resolver or Resolver()).lookup(
+                      Dataset, d["id"]))
@@ -0,0 +1,331 @@
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Tuple
+
+from .hashing import HashCache, get_default_hash_cache, hash_file_cached
+from .lazy import S3Artifact, dflow, upload_artifact
+from .utils import get_cache_dir
+
+DEFAULT_MULTIPART_THRESHOLD = 256 * 1024 * 1024
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_PART_WORKERS = 4
+
+
+class MinioMultipartClient:
+    def __init__(self,
+                 endpoint: str = None,
+                 access_key: str = None,
+                 secret_key: str = None,
+                 secure: bool = None,
+                 bucket_name: str = None,
+                 region: str = None) -> None:
+        """
+        Multipart operations on the S3-compatible storage of dflow
+
+        Args:
+            endpoint: endpoint of the storage, that of s3_config by default
+            access_key: access key, that of s3_config by default
+            secret_key: secret key, that of s3_config by default
+            secure: secure or not, that of s3_config by default
+            bucket_name: bucket name, that of s3_config by default
+            region: region of the bucket, looked up if not provided
+
+        Any object implementing create, upload_part, list_parts, complete,
+        abort and put can be used by MultipartUploader.
+        """
+        from minio import Minio
+        self.client = Minio(
+            endpoint=endpoint if endpoint is not None else
+            dflow.s3_config["endpoint"],
+            access_key=access_key if access_key is not None else
+            dflow.s3_config["access_key"],
+            secret_key=secret_key if secret_key is not None else
+            dflow.s3_config["secret_key"],
+            secure=secure if secure is not None else dflow.s3_config["secure"],
+            region=region)
+        self.bucket_name = bucket_name if bucket_name is not None else \
+            dflow.s3_config["bucket_name"]
+
+    def __repr__(self):
+        return "<MinioMultipartClient %s>" % self.bucket_name
+
+    # minio exposes the multipart API only through protected methods, which
+    # are called by keyword as their positional arguments have changed
+    # across releases
+    def create(self, key: str) -> str:
+        return self.client._create_multipart_upload(
+            bucket_name=self.bucket_name, object_name=key, headers={})
+
+    def upload_part(self, key: str, upload_id: str, number: int,
+                    data: bytes) -> str:
+        return self.client._upload_part(
+            bucket_name=self.bucket_name, object_name=key, data=data,
+            headers=None, upload_id=upload_id, part_number=number)
+
+    def list_parts(self, key: str, upload_id: str) -> Dict[int, str]:
+        parts = {}
+        marker = None
+        while True:
+            result = self.client._list_parts(
+                bucket_name=self.bucket_name, object_name=key,
+                upload_id=upload_id, part_number_marker=marker)
+            parts.update((p.part_number, p.etag) for p in result.parts)
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def complete(self, key: str, upload_id: str,
+                 parts: Dict[int, str]) -> None:
+        from minio.datatypes import Part
+        self.client._complete_multipart_upload(
+            bucket_name=self.bucket_name, object_name=key,
+            upload_id=upload_id,
+            parts=[Part(part_number=n, etag=parts[n]) for n in sorted(parts)])
+
+    def abort(self, key: str, upload_id: str) -> None:
+        self.client._abort_multipart_upload(
+            bucket_name=self.bucket_name, object_name=key,
+            upload_id=upload_id)
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(self.bucket_name, key, io.BytesIO(data),
+                               len(data))
+
+
+def artifact_relpath(path: str) -> str:
+    """Path of a file within the artifact uploaded from it, as laid out by
+    upload_artifact of dflow"""
+    abspath = os.path.abspath(path)
+    cwd = os.getcwd()
+    if abspath.startswith(cwd + os.sep):
+        relpath = abspath[len(cwd) + 1:]
+    else:
+        relpath = os.path.splitdrive(abspath)[1].lstrip("/\\")
+    return relpath.replace("\\", "/")
+
+
+class MultipartUploader:
+    def __init__(self,
+                 threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+                 part_size: int = DEFAULT_PART_SIZE,
+                 max_workers: int = DEFAULT_PART_WORKERS,
+                 client=None,
+                 manifest_dir: str = None,
+                 upload=upload_artifact,
+                 hashes: HashCache = None) -> None:
+        """
+        Uploader of local paths splitting large files into parts uploaded
+        concurrently by S3 multipart upload, and resuming interrupted
+        uploads
+
+        Args:
+            threshold: size in bytes above which files are uploaded in
+                parts, smaller files and directories are uploaded by upload
+            part_size: size in bytes of the parts, at least 5 MiB except
+                for the last one as required by S3
+            max_workers: maximum number of parts of a file uploaded
+                simultaneously
+            client: multipart client of the storage, a MinioMultipartClient
+                on the storage of dflow by default
+            manifest_dir: directory of the resume manifests, multipart/
+                under the cache directory by default
+            upload: function uploading the other paths
+            hashes: cache of the digests of the files, shared with the
+                UploadIndex by default so that a file is read once
+
+        The uploader is called with a local path and returns the uploaded
+        artifact, like upload_artifact. The parts uploaded are recorded in
+        a manifest keyed by the MD5 digest of the file, so that uploading
+        the same content again after a failure only uploads the missing
+        parts. Large files are stored uncompressed, with the same layout
+        and catalog as upload_artifact without archive, so the artifact
+        downloads and serializes as any S3Artifact.
+
+        The upload of a previous content of a file is aborted when the file
+        is uploaded again, and cleanup aborts those of files changed or
+        deleted since, so that their parts are not left in the bucket.
+        """
+        self.threshold = threshold
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self._client = client
+        if manifest_dir is None:
+            manifest_dir = get_cache_dir("multipart")
+        os.makedirs(manifest_dir, exist_ok=True)
+        self.manifest_dir = manifest_dir
+        self.upload = upload
+        self.hashes = hashes if hashes is not None else \
+            get_default_hash_cache()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<MultipartUploader threshold=%s part_size=%s>" % (
+            self.threshold, self.part_size)
+
+    def __call__(self, path: str):
+        if not os.path.isfile(path) or os.path.getsize(path) <= \
+                self.threshold or not self.supported():
+            return self.upload(path)
+        return self.upload_file(path)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = MinioMultipartClient()
+        return self._client
+
+    def supported(self) -> bool:
+        """Whether large files can be uploaded in parts, i.e. unless dflow
+        runs in debug mode without S3 or on a custom storage client"""
+        if self._client is not None:
+            return True
+        if dflow.config["mode"] == "debug" and not dflow.config["debug_s3"]:
+            return False
+        return dflow.s3_config["storage_client"] is None
+
+    def manifest_path(self, digest: str) -> str:
+        return os.path.join(self.manifest_dir, "%s.json" % digest)
+
+    def read_manifest(self, digest: str) -> Optional[dict]:
+        try:
+            with open(self.manifest_path(digest), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def iter_manifests(self) -> Iterator[Tuple[str, dict]]:
+        """(digest, manifest) of the uploads not completed"""
+        try:
+            names = os.listdir(self.manifest_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".json"):
+                manifest = self.read_manifest(name[:-len(".json")])
+                if manifest is not None:
+                    yield name[:-len(".json")], manifest
+
+    def abort(self, digest: str, manifest: dict) -> None:
+        """Abort an upload, dropping the parts stored, and its manifest"""
+        try:
+            self.client.abort(manifest["object"], manifest["upload_id"])
+        except Exception as e:
+            # e.g. aborted or expired already
+            print("failed to abort the upload of %s: %s" % (
+                manifest.get("object"), e))
+        try:
+            os.remove(self.manifest_path(digest))
+        except OSError:
+            pass
+
+    def load_manifest(self, digest: str, size: int) -> Optional[dict]:
+        manifest = self.read_manifest(digest)
+        if manifest is None:
+            return None
+        if manifest.get("size") != size or \
+                manifest.get("part_size") != self.part_size:
+            # cannot be resumed with these parts
+            self.abort(digest, manifest)
+            return None
+        try:
+            # the parts stored are authoritative, the upload may also have
+            # been aborted or expired meanwhile
+            manifest["parts"] = {str(n): etag for n, etag in
+                                 self.client.list_parts(
+                                     manifest["object"],
+                                     manifest["upload_id"]).items()}
+        except Exception:
+            return None
+        return manifest
+
+    def abort_previous(self, path: str, digest: str) -> None:
+        """Abort the uploads of other contents of path"""
+        for d, manifest in self.iter_manifests():
+            if d != digest and manifest.get("path") == path:
+                self.abort(d, manifest)
+
+    def cleanup(self, max_age: float = None) -> int:
+        """
+        Abort the uploads not completed whose file has been deleted or
+        changed since, returning the number of uploads aborted
+
+        Args:
+            max_age: also abort the uploads started more than max_age
+                seconds ago
+        """
+        aborted = 0
+        for digest, manifest in self.iter_manifests():
+            path = manifest.get("path")
+            if path is None or not os.path.isfile(path) or \
+                    os.path.getsize(path) != manifest.get("size") or \
+                    (max_age is not None and
+                     time.time() - manifest.get("created", 0) > max_age) or \
+                    self.md5(path) != digest:
+                self.abort(digest, manifest)
+                aborted += 1
+        return aborted
+
+    def md5(self, path: str) -> str:
+        return hash_file_cached(path, ["md5"], self.hashes)["md5"]
+
+    def save_manifest(self, digest: str, manifest: dict) -> None:
+        path = self.manifest_path(digest)
+        tmp = "%s.%s.tmp" % (path, threading.get_ident())
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
+
+    def upload_file(self, path: str) -> S3Artifact:
+        size = os.path.getsize(path)
+        digest = self.md5(path)
+        manifest = self.load_manifest(digest, size)
+        if manifest is None:
+            self.abort_previous(os.path.abspath(path), digest)
+            key = "%supload/%s" % (dflow.s3_config["prefix"], uuid.uuid4())
+            obj = "%s/%s" % (key, artifact_relpath(path))
+            manifest = {"key": key, "object": obj, "size": size,
+                        "part_size": self.part_size, "parts": {},
+                        "upload_id": self.client.create(obj),
+                        "path": os.path.abspath(path),
+                        "created": time.time()}
+            self.save_manifest(digest, manifest)
+        key, obj = manifest["key"], manifest["object"]
+        parts = manifest["parts"]
+        numbers = [n for n in range(1, -(-size // self.part_size) + 1)
+                   if str(n) not in parts]
+
+        def upload_part(number):
+            offset = (number - 1) * self.part_size
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(min(self.part_size, size - offset))
+            etag = self.client.upload_part(obj, manifest["upload_id"], number,
+                                           data)
+            with self.lock:
+                parts[str(number)] = etag
+                self.save_manifest(digest, manifest)
+
+        if numbers:
+            with ThreadPoolExecutor(max_workers=min(
+                    self.max_workers, len(numbers))) as executor:
+                futures = [executor.submit(upload_part, n) for n in numbers]
+                _, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in not_done:
+                    future.cancel()
+            for future in futures:
+                if not future.cancelled() and future.exception() is not None:
+                    raise future.exception()
+        self.client.complete(obj, manifest["upload_id"],
+                             {int(n): etag for n, etag in parts.items()})
+        # the path within the artifact is that of the first attempt
+        path_list = [{"dflow_list_item": obj[len(key) + 1:], "order": 0}]
+        self.client.put("%s/%s/%s" % (key, dflow.config["catalog_dir_name"],
+                                      uuid.uuid4()),
+                        json.dumps({"path_list": path_list}).encode())
+        os.remove(self.manifest_path(digest))
+        return S3Artifact(key=key, path_list=path_list)
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
+from .client import RegistryClient, get_default_client
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def fetch_page(cls, params: dict, client: RegistryClient,
+               domain: str = None) -> dict:
+    d = client.get(cls._endpoint, params=params, domain=domain,
+                   raise_error=True)
+    return d.get("data") or {}
+
+
+def page_key(lis: List[dict]) -> list:
+    """Identity of a page, the ids of its records (the records themselves
+    if some have no id)"""
+    ids = [r.get("id") if isinstance(r, dict) else None for r in lis]
+    return lis if None in ids else ids
+
+
+def iter_pages(cls,
+               params: dict,
+               page_size: int = DEFAULT_PAGE_SIZE,
+               prefetch: bool = False,
+               domain: str = None,
+               client: RegistryClient = None) -> Iterator[List[dict]]:
+    """
+    Iterate over the pages of records of a query
+
+    Args:
+        cls: class of the entities
+        params: parameters of the query
+        page_size: number of records per page
+        prefetch: fetch the next page in background while the current page
+            is consumed
+        domain: domain of the registry
+        client: client used for querying
+
+    Pages are requested with page and page_size parameters, or with the
+    cursor returned in data.cursor if the registry sets one. A page is only
+    requested once the previous one has been consumed (or is being consumed
+    when prefetching), so at most two pages are held at once. Raises
+    RegistryError if a page cannot be fetched.
+
+    Iteration stops at the first page shorter than page_size, or at a page
+    holding the same records as the previous one, as a registry ignoring
+    paging returns all the records for every page.
+    """
+    client = client or get_default_client()
+    params = dict(params, page_size=page_size)
+
+    def next_params(page, data):
+        if data.get("cursor"):
+            return dict(params, cursor=data["cursor"])
+        return dict(params, page=page)
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        page = 1
+        data = fetch_page(cls, dict(params, page=page), client, domain)
+        previous = None
+        while True:
+            lis = data.get(cls._list_key) or []
+            key = page_key(lis)
+            if lis and key == previous:
+                return
+            previous = key
+            # a registry ignoring paging returns more than page_size
+            last = len(lis) != page_size
+            if not last:
+                page += 1
+                if executor is not None:
+                    future = executor.submit(fetch_page, cls,
+                                             next_params(page, data), client,
+                                             domain)
+            yield lis
+            if last:
+                return
+            if executor is not None:
+                data = future.result()
+            else:
+                data = fetch_page(cls, next_params(page, data), client,
+                                  domain)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,206 @@
+from typing import Callable, Dict, Optional
+
+from .instrumentation import hooks, span
+
+# encoders of the values held by artifact fields by type, and decoders by
+# the key of their encoding (e.g. "http" for {"http": {...}})
+artifact_encoders: Dict[type, Callable] = {}
+artifact_decoders: Dict[str, Callable] = {}
+
+
+def register_artifact(cls: type, encode: Callable, key: str = None,
+                      decode: Callable = None) -> None:
+    """
+    Register a type of value held by artifact fields
+
+    Args:
+        cls: type of the values
+        encode: function encoding a value into a dict
+        key: single key of the encoded dicts
+        decode: function decoding the value of key, called with a resolver
+            of references as well
+    """
+    artifact_encoders[cls] = encode
+    if key is not None:
+        artifact_decoders[key] = decode
+
+
+def artifact_encoder(value) -> Optional[Callable]:
+    encode = artifact_encoders.get(type(value))
+    if encode is None:
+        for cls, f in list(artifact_encoders.items()):
+            if isinstance(value, cls):
+                # memoize subclasses so that later lookups are exact
+                artifact_encoders[type(value)] = encode = f
+                break
+    return encode
+
+
+def encode_item(value) -> Optional[dict]:
+    """Encode an artifact or a reference, None if not supported"""
+    encode = artifact_encoder(value)
+    return None if encode is None else encode(value)
+
+
+def decode_item(d: dict, resolver=None):
+    """Decode an artifact or a reference, None if not supported"""
+    for key, value in d.items():
+        decode = artifact_decoders.get(key)
+        if decode is not None:
+            return decode(value, resolver)
+    return None
+
+
+def encode_artifact(value) -> Optional[dict]:
+    """Encode the value of an artifact field: an artifact or a reference,
+    or a dict or list of them"""
+    if value is None:
+        return None
+    encode = artifact_encoders.get(type(value))
+    if encode is not None:
+        return encode(value)
+    if isinstance(value, dict):
+        return {"dict": {k: encode_item(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"list": [encode_item(i) for i in value]}
+    encode = artifact_encoder(value)
+    if encode is not None:
+        return encode(value)
+    raise TypeError("%s is not supported artifact" % type(value))
+
+
+class Codec:
+    def __init__(self, cls) -> None:
+        """
+        Encoder and decoder of the records of an entity class, generated
+        from its schema once per class so that no reflection is left per
+        record
+
+        Args:
+            cls: entity class, whose _fields are encoded in order, those
+                in _artifact_fields by encode_artifact
+
+        The decoder sets the fields of a new instance from a record
+        without calling __init__, leaving the artifact fields to None for
+        the caller to decode them (references need a resolver).
+        """
+        self.cls = cls
+        self.fields = cls._fields
+        self.artifact_fields = tuple(f for f in cls._fields
+                                     if f in cls._artifact_fields)
+        self.encode = self.compile_encoder()
+        self.decode = self.compile_decoder()
+        self.projections = {}
+
+    def __repr__(self):
+        return "<Codec %s>" % self.cls.__name__
+
+    def compile(self, name: str, lines: list, namespace: dict) -> Callable:
+        exec("\n".join(lines), namespace)
+        return namespace[name]
+
+    def compile_encoder(self) -> Callable:
+        lines = ["def encode(obj):", "    d = {"]
+        for f in self.fields:
+            if f in self.artifact_fields:
+                lines.append("        %r: encode_artifact(obj.%s)," % (f, f))
+            else:
+                lines.append("        %r: obj.%s," % (f, f))
+        lines += ["    }",
+                  "    if obj._extra:",
+                  "        d.update(obj._extra)",
+                  "    return d"]
+        return self.compile("encode", lines,
+                            {"encode_artifact": encode_artifact})
+
+    def decoder(self, fields: frozenset = None) -> Callable:
+        """Decoder setting only the given fields, all if None, compiled on
+        first use"""
+        if fields is None:
+            return self.decode
+        decode = self.projections.get(fields)
+        if decode is None:
+            decode = self.projections[fields] = self.compile_decoder(fields)
+        return decode
+
+    def compile_decoder(self, fields: frozenset = None) -> Callable:
+        lines = ["def decode(record):",
+                 "    obj = new(cls)",
+                 "    get = record.get"]
+        for f in self.fields:
+            if fields is not None and f not in fields:
+                # left unset, so that reading it goes to Entity.__getattr__
+                continue
+            if f in self.artifact_fields:
+                lines.append("    obj.%s = None" % f)
+            else:
+                lines.append("    obj.%s = get(%r)" % (f, f))
+        if self.cls._keep_extra and fields is None:
+            lines += ["    if record.keys() <= names:",
+                      "        obj._extra = None",
+                      "    else:",
+                      "        obj._extra = {k: v for k, v in record.items()",
+                      "                      if k not in names}"]
+        else:
+            lines.append("    obj._extra = None")
+        lines.append("    return obj")
+        return self.compile("decode", lines, {
+            "new": object.__new__, "cls": self.cls,
+            "names": frozenset(self.fields)})
+
+
+class Entity:
+    """
+    Base of the entities of the registry, declaring their fields as
+    __slots__ and holding the codec compiled from them
+
+    Subclasses declare their fields in __slots__, in the order they are
+    encoded, and the artifact fields among them in _artifact_fields.
+    Fields returned by the registry but not declared are kept in _extra if
+    _keep_extra is set (and readable as attributes), dropped otherwise.
+    Entities decoded from a projection of their fields hold in _deferred
+    the loader of the other fields, called on first access to any of them.
+    """
+    __slots__ = ("_extra", "_deferred")
+    _endpoint = None
+    _list_key = None
+    _fields = ()
+    _artifact_fields = ()
+    _keep_extra = False
+    _codec = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get("__slots__", ())
+            fields += [s for s in ([slots] if isinstance(slots, str)
+                                   else slots) if not s.startswith("_")]
+        cls._fields = tuple(fields)
+        cls._codec = Codec(cls)
+
+    def __getattr__(self, name):
+        # only reached if the attribute is not found otherwise
+        if not name.startswith("_"):
+            extra = self._extra
+            if extra and name in extra:
+                return extra[name]
+            if name in self._fields:
+                deferred = getattr(self, "_deferred", None)
+                if deferred is not None:
+                    deferred.load(self)
+                    return getattr(self, name)
+        raise AttributeError("%r object has no attribute %r"
+                             % (type(self).__name__, name))
+
+    def to_dict(self) -> dict:
+        if hooks:
+            with span("to_dict", entity=type(self).__name__):
+                return self._codec.encode(self)
+        return self._codec.encode(self)
+
+    @classmethod
+    def decode(cls, record: dict):
+        """New instance holding the fields of a record, the artifact fields
+        left to None"""
+        return cls._codec.decode(record)
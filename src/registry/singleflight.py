@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, Hashable
+
+
+class Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        """
+        Coalescer of concurrent identical calls: while a call with a key is
+        in flight, the calls with the same key wait for its result (or
+        exception) instead of being made again. Calls are coalesced across
+        threads by do, and across the tasks of an event loop by ado.
+
+        Attributes:
+            calls: number of calls actually made
+            collapsed: number of calls served by another one in flight
+        """
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def __repr__(self):
+        return "<SingleFlight calls=%s collapsed=%s>" % (self.calls,
+                                                         self.collapsed)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"calls": self.calls, "collapsed": self.collapsed,
+                    "in_flight": len(self.in_flight)}
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        """Call func(*args, **kwargs) unless a call with key is in flight,
+        in which case wait for it and return its result"""
+        with self.lock:
+            call = self.in_flight.get(key)
+            if call is None:
+                call = self.in_flight[key] = Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, func: Callable[..., Awaitable],
+                  *args, **kwargs):
+        """Same as do for coroutine functions, the call being run as a task
+        so that cancelling one of the waiters does not cancel the others"""
+        loop = asyncio.get_event_loop()
+        # tasks can only be awaited from their loop
+        key = (id(loop), key)
+        with self.lock:
+            task = self.in_flight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                self.in_flight[key] = task
+                task.add_done_callback(lambda _: self.forget(key))
+                self.calls += 1
+            else:
+                self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable) -> None:
+        with self.lock:
+            self.in_flight.pop(key, None)
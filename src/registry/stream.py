@@ -0,0 +1,139 @@
+import re
+from typing import Iterable, Iterator, Tuple
+
+from .utils import json_loads
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# structural characters and string openings
+token_re = re.compile(rb'[\[\]{}:,"]')
+# inside the items only the nesting matters: skip anything but brackets,
+# along with short strings without escapes; the other strings are left to
+# string_end, as failing to match them would backtrack over their length
+skip_re = re.compile(rb'[^\[\]{}"]*(?:"[^"\\]{0,256}"[^\[\]{}"]*)*')
+
+
+def string_end(buf: bytearray, start: int) -> int:
+    """Offset of the first unescaped quote of buf from start, -1 if the
+    string is not received entirely yet"""
+    j = buf.find(b'"', start)
+    while j >= 0:
+        k = j - 1
+        while buf[k] == 0x5c:  # backslash
+            k -= 1
+        if (j - k) % 2:
+            return j
+        j = buf.find(b'"', j + 1)
+    return -1
+
+
+def iter_json_items(chunks: Iterable[bytes],
+                    path: Tuple[str, ...]) -> Iterator:
+    """
+    Decode the items of the JSON array found at path in a document received
+    in chunks, one at a time
+
+    Args:
+        chunks: bytes of the document, e.g. from iter_content of a
+            streamed response
+        path: keys of the nested objects leading to the array, e.g.
+            ("data", "models")
+
+    Only the item being received is buffered, the other parts of the
+    document are skipped as they come, so memory stays proportional to the
+    largest item. Nothing is yielded if the array is not found.
+    """
+    path = list(path)
+    buf = bytearray()
+    pos = 0
+    resume = 0  # where to look for the end of a string being received
+    # containers opened, with the key of each one in its parent object
+    stack = []
+    key = None
+    colon = False
+    depth = None  # length of stack inside the array, once found
+    start = None  # offset of the item being received
+    in_string = False  # whether pos is at a string being received
+    for chunk in chunks:
+        buf += chunk
+        while True:
+            inside = depth is not None and len(stack) > depth
+            if in_string:
+                end = string_end(buf, max(pos + 1, resume))
+                if end < 0:
+                    resume = len(buf)
+                    break
+                i = pos
+                pos = end + 1
+                resume = 0
+                in_string = False
+                if not inside and not colon and stack and \
+                        stack[-1][0] == 0x7b:
+                    key = bytes(buf[i:pos])
+                continue
+            if inside:
+                i = skip_re.match(buf, pos).end()
+                if i == len(buf):
+                    pos = i
+                    break
+            else:
+                m = token_re.search(buf, pos)
+                if m is None:
+                    pos = len(buf)
+                    break
+                i = m.start()
+            c = buf[i]
+            if c == 0x22:  # string
+                pos = i
+                in_string = True
+                continue
+            pos = i + 1
+            if c == 0x3a:  # colon
+                colon = True
+            elif c == 0x2c:  # comma
+                colon = False
+                if depth is not None and len(stack) == depth:
+                    if start is not None:
+                        # end of a scalar item
+                        yield json_loads(bytes(buf[start:i]))
+                    start = pos
+            elif c == 0x7b or c == 0x5b:  # { or [
+                if depth is not None:
+                    if len(stack) == depth and start is None:
+                        start = i
+                    stack.append((c, None))
+                else:
+                    member = None
+                    if stack and stack[-1][0] == 0x7b and key is not None:
+                        member = json_loads(key)
+                    stack.append((c, member))
+                    if c == 0x5b and len(stack) == len(path) + 1 and \
+                            [k for _, k in stack[1:]] == path:
+                        depth = len(stack)
+                        start = pos
+                key = None
+                colon = False
+            else:  # } or ]
+                stack.pop()
+                if depth is None:
+                    continue
+                if len(stack) == depth:
+                    # end of an object or array item
+                    yield json_loads(bytes(buf[start:pos]))
+                    start = None
+                elif len(stack) == depth - 1:
+                    # end of the array, a last scalar item may be pending
+                    item = b"" if start is None else \
+                        bytes(buf[start:i]).strip()
+                    if item:
+                        yield json_loads(item)
+                    return
+        # drop what has been consumed
+        cut = pos if start is None else start
+        if cut:
+            del buf[:cut]
+            pos -= cut
+            if start is not None:
+                start -= cut
+            if resume:
+                resume -= cut
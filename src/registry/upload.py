@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from functools import partial
+from typing import List, Optional
+
+from .artifacts import LocalPath
+from .hashing import HashCache, get_default_hash_cache, hash_file_cached
+from .instrumentation import instrumented_upload
+from .lazy import S3Artifact, upload_artifact
+from .multipart import artifact_relpath
+from .utils import get_cache_dir
+
+DEFAULT_UPLOAD_WORKERS = 4
+
+
+class UploadIndex:
+    def __init__(self, path: str = None, hashes: HashCache = None) -> None:
+        """
+        Persistent index from the content of local files to the artifacts
+        they were uploaded to, so that unchanged files are not uploaded
+        again
+
+        Args:
+            path: path of the SQLite database, upload_index.db under the
+                cache directory by default
+            hashes: cache of the digests of the files, shared with the
+                MultipartUploader by default so that a file is read once
+
+        Entries are keyed by the MD5 digest of the file together with its
+        path within the uploaded artifact, relative to the current
+        directory (see artifact_relpath), since the artifact is laid out by
+        it. Only files (not directories) uploaded to S3Artifact are
+        indexed.
+        """
+        if path is None:
+            path = os.path.join(get_cache_dir(), "upload_index.db")
+        self.path = path
+        self.hashes = hashes if hashes is not None else \
+            get_default_hash_cache()
+        with self.connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS artifacts ("
+                         "digest TEXT, name TEXT, key TEXT, urn TEXT, "
+                         "slice TEXT, created REAL, "
+                         "PRIMARY KEY (digest, name))")
+
+    def __repr__(self):
+        return "<UploadIndex %s>" % self.path
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, digest: str, name: str) -> Optional[S3Artifact]:
+        with self.connect() as conn:
+            row = conn.execute("SELECT key, urn, slice FROM artifacts WHERE "
+                               "digest = ? AND name = ?",
+                               (digest, name)).fetchone()
+        if row is None:
+            return None
+        return S3Artifact.from_dict({"key": row[0], "urn": row[1],
+                                     "slice": row[2]})
+
+    def put(self, digest: str, name: str, artifact: S3Artifact) -> None:
+        with self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO artifacts VALUES "
+                         "(?, ?, ?, ?, ?, ?)",
+                         (digest, name, artifact.key, artifact.urn,
+                          artifact.slice, time.time()))
+
+    def invalidate(self, digest: str = None) -> None:
+        with self.connect() as conn:
+            if digest is None:
+                conn.execute("DELETE FROM artifacts")
+            else:
+                conn.execute("DELETE FROM artifacts WHERE digest = ?",
+                             (digest, ))
+
+    def upload(self, path: str, upload=upload_artifact):
+        if not os.path.isfile(path):
+            return upload(path)
+        digest = hash_file_cached(path, ["md5"], self.hashes)["md5"]
+        name = artifact_relpath(path)
+        artifact = self.get(digest, name)
+        if artifact is None:
+            artifact = upload(path)
+            if isinstance(artifact, S3Artifact):
+                self.put(digest, name, artifact)
+        return artifact
+
+
+def iter_local_paths(obj, keys: List[str]):
+    """Yield (container, key, local path) of the LocalPath artifacts of obj,
+    where container is obj itself or the dict/list holding the artifact"""
+    for key in keys:
+        value = getattr(obj, key)
+        if isinstance(value, LocalPath):
+            yield obj, key, value
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                if isinstance(v, LocalPath):
+                    yield value, k, v
+        elif isinstance(value, list):
+            for i, v in enumerate(value):
+                if isinstance(v, LocalPath):
+                    yield value, i, v
+
+
+def upload_local_artifacts(obj,
+                           keys: List[str],
+                           max_workers: int = DEFAULT_UPLOAD_WORKERS,
+                           upload=upload_artifact,
+                           index: UploadIndex = None) -> None:
+    """
+    Upload the LocalPath artifacts of obj concurrently and replace each of
+    them in place by the uploaded artifact
+
+    Args:
+        obj: model or dataset whose artifacts are uploaded
+        keys: attributes holding artifacts
+        max_workers: maximum number of concurrent uploads
+        upload: function uploading a local path and returning the artifact
+        index: skip uploading files already uploaded according to the index
+
+    Raises the first failure once the running uploads are finished and the
+    pending ones cancelled; artifacts uploaded successfully are replaced
+    anyway, so that retrying does not upload them again.
+    """
+    slots = list(iter_local_paths(obj, keys))
+    if not slots:
+        return
+    paths = list(dict.fromkeys(local.path for _, _, local in slots))
+    upload = instrumented_upload(upload)
+    if index is not None:
+        upload = partial(index.upload, upload=upload)
+    with ThreadPoolExecutor(max_workers=min(max_workers,
+                                            len(paths))) as executor:
+        futures = {path: executor.submit(upload, path) for path in paths}
+        _, not_done = wait(futures.values(), return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+    replace_local_paths(obj, slots, {
+        path: future.exception() or future.result()
+        for path, future in futures.items() if not future.cancelled()})
+
+
+def replace_local_paths(obj, slots: list, results: dict) -> None:
+    """Replace the LocalPath artifacts of slots by the results of their
+    uploads, then raise the first error met if any"""
+    error = None
+    for container, key, local in slots:
+        if local.path not in results:
+            continue
+        result = results[local.path]
+        if isinstance(result, BaseException):
+            error = error or result
+            continue
+        if container is obj:
+            setattr(obj, key, result)
+        else:
+            container[key] = result
+    if error is not None:
+        raise error
@@ -1,12 +1,49 @@
-import hashlib
+import json
+import os
+import re
+
+from .hashing import hash_file
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def check_md5(path: str):
-    m = hashlib.md5()
-    with open(path, 'rb') as fobj:
-        while True:
-            data = fobj.read(4096)
-            if not data:
-                break
-            m.update(data)
-    return m.hexdigest()
\ No newline at end of file
+    return hash_file(path, ["md5"])["md5"]
+
+
+def get_cache_dir(*subdirs: str) -> str:
+    """Local cache directory of the SDK, $REGISTRY_CACHE_DIR if set and
+    ~/.cache/registry otherwise"""
+    root = os.environ.get("REGISTRY_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "registry")
+    path = os.path.join(root, *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def version_key(version: str) -> tuple:
+    """Sort key of versions comparing their numeric parts as numbers, e.g.
+    v1.0.10 after v1.0.9"""
+    return tuple((0, int(p), "") if p.isdigit() else (1, 0, p)
+                 for p in re.split(r"[.\-_+]", version.lstrip("vV")))
+
+
+def json_dumps(obj) -> bytes:
+    """Serialize obj to JSON bytes, by orjson if installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. non-str keys, which json converts
+            pass
+    return json.dumps(obj).encode()
+
+
+def json_loads(data):
+    """Deserialize JSON bytes or str, by orjson if installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,260 @@
+import fnmatch
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .client import RegistryClient, get_default_client
+from .model import Resolver
+from .utils import version_key
+
+wildcard_re = re.compile(r"[*?\[]")
+constraint_re = re.compile(r"^\s*(>=|<=|==|!=|>|<)?\s*(\S+)\s*$")
+
+
+class Versions:
+    __slots__ = ("keys", "versions", "ids")
+
+    def __init__(self) -> None:
+        """Versions of an entity with their ids, sorted by version_key"""
+        self.keys = []
+        self.versions = []
+        self.ids = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, version: str, id: str) -> None:
+        key = version_key(version)
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.versions[i] == version:
+                self.ids[i] = id
+                return
+            i += 1
+        self.keys.insert(i, key)
+        self.versions.insert(i, version)
+        self.ids.insert(i, id)
+
+    def select(self, spec: str = None) -> List[Tuple[str, str]]:
+        """
+        (version, id) selected by spec, by increasing version
+
+        Args:
+            spec: None for all the versions, latest, a pattern with
+                wildcards such as v1.0.*, a version, or comparisons with
+                versions separated by commas such as >=1.2,<2
+        """
+        if not spec:
+            return list(zip(self.versions, self.ids))
+        if spec == "latest":
+            return list(zip(self.versions[-1:], self.ids[-1:]))
+        if wildcard_re.search(spec):
+            return [(v, i) for v, i in zip(self.versions, self.ids)
+                    if fnmatch.fnmatchcase(v, spec)]
+        lo, hi = 0, len(self.keys)
+        excluded = set()
+        for constraint in spec.split(","):
+            m = constraint_re.match(constraint)
+            if m is None:
+                raise ValueError("invalid version constraint %r" % constraint)
+            op, version = m.groups()
+            if op is None:
+                # a plain version matches exactly, not by version_key
+                return [(v, i) for v, i in zip(self.versions, self.ids)
+                        if v == version]
+            key = version_key(version)
+            if op == ">=":
+                lo = max(lo, bisect_left(self.keys, key))
+            elif op == ">":
+                lo = max(lo, bisect_right(self.keys, key))
+            elif op == "<=":
+                hi = min(hi, bisect_right(self.keys, key))
+            elif op == "<":
+                hi = min(hi, bisect_left(self.keys, key))
+            elif op == "==":
+                lo = max(lo, bisect_left(self.keys, key))
+                hi = min(hi, bisect_right(self.keys, key))
+            else:
+                excluded.add(key)
+        return [(self.versions[i], self.ids[i]) for i in range(lo, hi)
+                if self.keys[i] not in excluded]
+
+
+class Trie:
+    def __init__(self) -> None:
+        """Prefix tree of strings"""
+        self.root = {}
+
+    def add(self, word: str) -> None:
+        node = self.root
+        for c in word:
+            node = node.setdefault(c, {})
+        # characters are never empty, so "" marks the end of a word
+        node[""] = word
+
+    def prefixed(self, prefix: str = "") -> Iterator[str]:
+        """Words starting with prefix"""
+        node = self.root
+        for c in prefix:
+            node = node.get(c)
+            if node is None:
+                return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for c, child in node.items():
+                if c:
+                    stack.append(child)
+                else:
+                    yield child
+
+
+def match(pattern: Optional[str], trie: Trie) -> List[str]:
+    """Words of trie matching pattern, all if pattern is None"""
+    if not pattern:
+        return list(trie.prefixed())
+    prefix = wildcard_re.split(pattern, 1)[0]
+    if prefix == pattern:
+        return [w for w in trie.prefixed(pattern) if w == pattern]
+    return [w for w in trie.prefixed(prefix)
+            if fnmatch.fnmatchcase(w, pattern)]
+
+
+class VersionIndex:
+    def __init__(self,
+                 cls,
+                 client: RegistryClient = None,
+                 domain: str = None,
+                 refresh: bool = True) -> None:
+        """
+        Index of the versions of the entities of a class by namespace and
+        name, resolving latest versions, version ranges and namespace
+        patterns in memory so that only the selected records are fetched
+
+        Args:
+            cls: class of the entities, Model, Dataset, Workflow or OP
+            client: client used for listing and fetching the entities, the
+                index is kept up to date with the registrations made through
+                it
+            domain: domain of the registry
+            refresh: build the index from a listing of the entities right
+                away
+
+            index = VersionIndex(Model)
+            models = index.query(namespace="test_*", version=">=1.2")
+
+        Only namespace, name, version and id of the entities are kept. The
+        index is built from a single listing, streamed, and updated when
+        entities are registered through the client, but registrations by
+        others are only seen after refresh.
+        """
+        self.cls = cls
+        self.client = client or get_default_client()
+        self.domain = domain
+        self.url = self.client.url(cls._endpoint, domain)
+        self.namespaces = Trie()
+        self.entries: Dict[str, Dict[str, Versions]] = {}
+        self.lock = threading.Lock()
+        self.client.indexes.append(self)
+        if refresh:
+            self.refresh()
+
+    def __repr__(self):
+        return "<VersionIndex %s: %s entities>" % (self.cls.__name__,
+                                                   len(self))
+
+    def __len__(self):
+        return sum(len(versions) for names in self.entries.values()
+                   for versions in names.values())
+
+    def close(self) -> None:
+        """Stop updating the index on registrations"""
+        self.client.indexes.remove(self)
+
+    def refresh(self) -> None:
+        """Build the index again from a listing of all the entities"""
+        namespaces, entries = Trie(), {}
+        for record in self.client.iter_records(
+                self.cls._endpoint, {}, self.cls._list_key,
+                domain=self.domain, raise_error=True):
+            self.add_to(namespaces, entries, record)
+        with self.lock:
+            self.namespaces, self.entries = namespaces, entries
+
+    @staticmethod
+    def add_to(namespaces: Trie, entries: dict, record: dict) -> None:
+        namespace, name, version, id = (record.get(k) for k in (
+            "namespace", "name", "version", "id"))
+        if namespace is None or name is None or version is None or \
+                id is None:
+            return
+        names = entries.get(namespace)
+        if names is None:
+            names = entries[namespace] = {}
+            namespaces.add(namespace)
+        versions = names.get(name)
+        if versions is None:
+            versions = names[name] = Versions()
+        versions.add(version, str(id))
+
+    def add(self, record: dict) -> None:
+        """Index a record, holding at least namespace, name, version and
+        id"""
+        with self.lock:
+            self.add_to(self.namespaces, self.entries, record)
+
+    def registered(self, url: str, body, data: dict) -> None:
+        """Called by the client once entities are registered"""
+        if url == self.url:
+            self.add(dict(body, id=data.get("id")))
+        elif url == self.url + "/batch":
+            for record, id in zip(body, data.get("ids") or []):
+                self.add(dict(record, id=id))
+
+    def find(self,
+             namespace: str = None,
+             name: str = None,
+             version: str = None) -> List[Tuple[str, str, str, str]]:
+        """
+        (namespace, name, version, id) of the indexed entities matching,
+        sorted by namespace, name and version
+
+        Args:
+            namespace: namespace or pattern with wildcards, all if None
+            name: name or pattern with wildcards, all if None
+            version: version specification, see Versions.select
+        """
+        res = []
+        with self.lock:
+            for ns in sorted(match(namespace, self.namespaces)):
+                names = self.entries[ns]
+                if name and not wildcard_re.search(name):
+                    selected = [name] if name in names else []
+                else:
+                    selected = sorted(n for n in names if not name or
+                                      fnmatch.fnmatchcase(n, name))
+                for n in selected:
+                    res += [(ns, n, v, i)
+                            for v, i in names[n].select(version)]
+        return res
+
+    def latest(self, namespace: str, name: str) -> Optional[str]:
+        """Latest version of an entity, None if not indexed"""
+        res = self.find(namespace, name, "latest")
+        return res[0][2] if res else None
+
+    def query(self,
+              namespace: str = None,
+              name: str = None,
+              version: str = None,
+              lazy: bool = False) -> list:
+        """Same as the query of the class, resolving the entities in the
+        index and fetching only them, concurrently"""
+        keys = [(self.cls, id) for _, _, _, id in self.find(
+            namespace, name, version)]
+        resolver = Resolver(client=self.client, domain=self.domain,
+                            lazy=lazy)
+        resolver.fetch(keys)
+        records = [resolver.records.get(key) for key in keys]
+        return resolver.load(self.cls, [r for r in records if r is not None])
@@ -0,0 +1,182 @@
+import gzip
+from typing import Optional, Tuple
+
+from urllib3.util.request import ACCEPT_ENCODING
+
+from .utils import json_dumps, json_loads
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# smaller bodies are not worth the time of compressing them
+DEFAULT_COMPRESS_THRESHOLD = 1024
+# content encodings of responses decoded by urllib3, zstd and br if their
+# packages are installed
+RESPONSE_ENCODINGS = ACCEPT_ENCODING
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires zstandard, install "
+                              "it by `pip install zstandard`")
+        return zstandard.ZstdCompressor().compress(data)
+    raise ValueError("unsupported compression %r" % encoding)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires zstandard, install "
+                              "it by `pip install zstandard`")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError("unsupported compression %r" % encoding)
+
+
+class WireFormat:
+    def __init__(self,
+                 compression: Optional[str] = None,
+                 threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+                 binary: bool = True) -> None:
+        """
+        Encoding of the bodies exchanged with the registry
+
+        Args:
+            compression: content encoding of the request bodies of at least
+                threshold bytes, gzip or zstd (requires zstandard), for
+                registries decoding them; never compressed by default
+            threshold: size in bytes from which request bodies are
+                compressed
+            binary: accept MessagePack responses (requires msgpack), and
+                send MessagePack request bodies once the registry has
+                answered in MessagePack
+
+        Responses are compressed by the registry as negotiated by the
+        Accept-Encoding header, while HTTP has no negotiation of request
+        bodies: a compressed or MessagePack body answered as undecodable
+        (415, or 400 without the code of the registry) is sent again once
+        as plain JSON. If that succeeds, the following bodies are sent as
+        plain JSON; otherwise, or once a body so encoded has been answered
+        2xx, the encoding is kept without sending bodies again.
+        """
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression requires zstandard, install "
+                              "it by `pip install zstandard`")
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError("unsupported compression %r" % compression)
+        self.compression = compression
+        self.threshold = threshold
+        self.binary = binary and msgpack is not None
+        # whether the registry has answered in MessagePack
+        self.binary_accepted = False
+        # encodings of request bodies known to be decoded by the registry
+        self.decoded = set()
+
+    def __repr__(self):
+        return "<WireFormat compression=%s binary=%s>" % (
+            self.compression, self.binary_accepted)
+
+    def accept(self, stream: bool = False) -> dict:
+        """Headers of a query, whose response is decoded as it is received
+        if stream"""
+        if self.binary and not stream:
+            return {"Accept": "%s, %s;q=0.9" % (MSGPACK, JSON)}
+        return {"Accept": JSON}
+
+    def encode(self, body, plain: bool = False) -> Tuple[bytes, dict]:
+        """Body of a request and its headers, in uncompressed JSON if
+        plain"""
+        headers = self.accept()
+        if plain or not self.binary_accepted:
+            data = json_dumps(body)
+            headers["Content-Type"] = JSON
+        else:
+            data = msgpack.packb(body, use_bin_type=True)
+            headers["Content-Type"] = MSGPACK
+        if plain:
+            return data, headers
+        if self.compression is not None and len(data) >= self.threshold:
+            data = compress(data, self.compression)
+            headers["Content-Encoding"] = self.compression
+        return data, headers
+
+    def decode(self, content: bytes, content_type: Optional[str]):
+        """Body of a response, decompressed already"""
+        if content_type and content_type.startswith(MSGPACK) and \
+                msgpack is not None:
+            self.binary_accepted = self.binary
+            return msgpack.unpackb(content, raw=False, strict_map_key=False)
+        return json_loads(content)
+
+    def decode_error(self, content: bytes,
+                     content_type: Optional[str]) -> Optional[dict]:
+        """Body of an error response, None unless a response of the
+        registry"""
+        try:
+            res = self.decode(content, content_type)
+        except Exception:
+            return None
+        return res if isinstance(res, dict) else None
+
+    @staticmethod
+    def encoded(headers: dict) -> bool:
+        """Whether a request body was sent other than as plain JSON"""
+        return "Content-Encoding" in headers or \
+            headers.get("Content-Type") == MSGPACK
+
+    @staticmethod
+    def encoding(headers: dict) -> tuple:
+        return headers.get("Content-Encoding"), headers.get("Content-Type")
+
+    def undecoded(self, headers: dict, status: int,
+                  res: Optional[dict]) -> bool:
+        """
+        Whether a request body may not have been decoded by the registry,
+        and is to be sent again as plain JSON
+
+        Args:
+            headers: headers the body was sent with
+            status: status of the response
+            res: response, None if not decoded
+        """
+        if not self.encoded(headers) or \
+                self.encoding(headers) in self.decoded:
+            return False
+        if 200 <= status < 300:
+            self.decoded.add(self.encoding(headers))
+            return False
+        if status == 415:
+            return True
+        return status == 400 and not (isinstance(res, dict) and "code" in res)
+
+    def probed(self, headers: dict, accepted: bool) -> None:
+        """Record the result of sending again as plain JSON a body sent with
+        headers, whether the plain body was accepted"""
+        if accepted:
+            self.fallback(headers)
+        else:
+            # not rejected for its encoding
+            self.decoded.add(self.encoding(headers))
+
+    def fallback(self, headers: dict) -> None:
+        """Send plain JSON from now on, the body sent with headers having
+        been rejected while the same body in plain JSON was accepted"""
+        if "Content-Encoding" in headers:
+            print("the registry does not accept %s request bodies, sending "
+                  "them uncompressed" % headers["Content-Encoding"])
+            self.compression = None
+        if headers.get("Content-Type") == MSGPACK:
+            self.binary = self.binary_accepted = False
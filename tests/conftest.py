@@ -0,0 +1,27 @@
+"""Fixtures of the tests, run against the local stand-ins of the registry
+and of the storage kept with the benchmarks
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root, "src"))
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+
+from fake_registry import FakeRegistry  # noqa: E402
+from fake_storage import FakeMultipartClient  # noqa: E402
+
+
+@pytest.fixture
+def registry_server():
+    with FakeRegistry() as server:
+        yield server
+
+
+@pytest.fixture
+def storage():
+    return FakeMultipartClient()
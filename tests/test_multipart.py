@@ -0,0 +1,153 @@
+"""MultipartUploader against the in-memory stand-in of the storage, and the
+calls of MinioMultipartClient against the signatures of the installed
+minio"""
+import inspect
+import itertools
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import registry.hashing
+from registry.hashing import HashCache
+from registry.multipart import MinioMultipartClient, MultipartUploader
+from registry.upload import UploadIndex
+
+PART_SIZE = 64 * 1024
+mtimes = itertools.count(10 ** 18, 10 ** 9)
+
+
+def write(path, size, seed):
+    with open(path, "wb") as f:
+        f.write(bytes((i * seed) % 251 for i in range(size)))
+    # digests are cached by mtime, files are rewritten faster than it ticks
+    t = next(mtimes)
+    os.utime(path, ns=(t, t))
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def upload_failing(uploader, path):
+    with pytest.raises(IOError):
+        uploader(path)
+
+
+@pytest.fixture
+def uploader(storage, tmp_path):
+    return MultipartUploader(threshold=0, part_size=PART_SIZE, max_workers=1,
+                             client=storage,
+                             manifest_dir=str(tmp_path / "manifests"),
+                             upload=lambda path: None, hashes=HashCache())
+
+
+def stored_object(client, artifact):
+    objects = [k for k in client.objects
+               if k.startswith(artifact.key + "/") and "/.dflow" not in k]
+    assert len(objects) == 1
+    return client.objects[objects[0]]
+
+
+def test_resume(storage, uploader, tmp_path):
+    local = str(tmp_path / "resume.bin")
+    content = write(local, 5 * PART_SIZE + 100, 7)
+    storage.fail_parts.add(4)
+    upload_failing(uploader, local)
+    upload, = storage.uploads.values()
+    stored = set(upload["parts"])
+    # parts after the failed one may have been started meanwhile
+    assert {1, 2, 3} <= stored and 4 not in stored
+    assert len(list(uploader.iter_manifests())) == 1
+    artifact = uploader(local)
+    # only the missing parts are uploaded when resuming
+    assert storage.parts_uploaded == 6
+    assert stored_object(storage, artifact) == content
+    assert not storage.uploads and not list(uploader.iter_manifests())
+
+
+def test_abort_changed(storage, uploader, tmp_path):
+    local = str(tmp_path / "changed.bin")
+    write(local, 3 * PART_SIZE, 3)
+    storage.fail_parts.add(2)
+    upload_failing(uploader, local)
+    content = write(local, 3 * PART_SIZE, 5)
+    artifact = uploader(local)
+    assert len(storage.aborted) == 1
+    assert stored_object(storage, artifact) == content
+    assert not storage.uploads and not list(uploader.iter_manifests())
+
+
+def test_cleanup_deleted(storage, uploader, tmp_path):
+    local = str(tmp_path / "deleted.bin")
+    write(local, 3 * PART_SIZE, 3)
+    storage.fail_parts.add(1)
+    upload_failing(uploader, local)
+    os.remove(local)
+    assert uploader.cleanup() == 1
+    assert not storage.uploads and not list(uploader.iter_manifests())
+
+
+def test_cleanup_max_age(storage, uploader, tmp_path):
+    local = str(tmp_path / "unchanged.bin")
+    write(local, 2 * PART_SIZE, 11)
+    storage.fail_parts.add(2)
+    upload_failing(uploader, local)
+    assert uploader.cleanup() == 0
+    assert uploader.cleanup(max_age=-1) == 1
+    assert not storage.uploads
+
+
+def test_read_once(storage, uploader, tmp_path, monkeypatch):
+    reads = []
+    hash_file = registry.hashing.hash_file
+
+    def spy(path, *args, **kwargs):
+        reads.append(path)
+        return hash_file(path, *args, **kwargs)
+    monkeypatch.setattr(registry.hashing, "hash_file", spy)
+    local = str(tmp_path / "large.bin")
+    write(local, 3 * PART_SIZE, 13)
+    index = UploadIndex(str(tmp_path / "index.db"), hashes=uploader.hashes)
+    storage.fail_parts.add(2)
+    with pytest.raises(IOError):
+        index.upload(local, upload=uploader)
+    assert uploader.cleanup() == 0
+    index.upload(local, upload=uploader)
+    index.upload(local, upload=uploader)
+    assert reads == [local]
+
+
+class SignatureChecker:
+    """Stand-in of Minio checking the calls made against the signatures of
+    the installed minio"""
+    results = {
+        "_create_multipart_upload": "upload-id",
+        "_upload_part": "etag",
+        "_list_parts": SimpleNamespace(parts=[], is_truncated=False),
+    }
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __getattr__(self, name):
+        from minio import Minio
+        signature = inspect.signature(getattr(Minio, name))
+
+        def method(*args, **kwargs):
+            signature.bind(self, *args, **kwargs)
+            self.calls.append(name)
+            return self.results.get(name)
+        return method
+
+
+def test_minio_signatures():
+    pytest.importorskip("minio")
+    client = MinioMultipartClient.__new__(MinioMultipartClient)
+    client.client = SignatureChecker()
+    client.bucket_name = "bucket"
+    upload_id = client.create("key")
+    client.upload_part("key", upload_id, 1, b"data")
+    client.list_parts("key", upload_id)
+    client.complete("key", upload_id, {1: "etag"})
+    client.abort("key", upload_id)
+    client.put("key", b"data")
+    assert len(client.client.calls) == 6
@@ -0,0 +1,59 @@
+"""Streamed query responses decoded by windows against the local stand-in
+registry"""
+import pytest
+
+from registry.artifacts import HTTPArtifact
+from registry.client import RegistryClient
+from registry.model import DEFAULT_STREAM_WINDOW, Dataset, Model, Resolver
+
+COUNT = 3 * DEFAULT_STREAM_WINDOW + 8
+
+
+@pytest.fixture
+def client(registry_server):
+    client = RegistryClient(registry_server.url)
+    for i in range(COUNT):
+        data = Dataset("stream", "d%d" % i, "v1",
+                       location=HTTPArtifact(url="http://host/d%d" % i))
+        data.insert(client=client)
+        Model("stream", "m%d" % i, "v1", source=data,
+              location=HTTPArtifact(url="http://host/m%d" % i)).insert(
+                  client=client)
+    return client
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Number of keys of each batch fetched by the resolvers, and the
+    largest number of records they held"""
+    batches = []
+    held = [0]
+    fetch = Resolver.fetch
+
+    def spy(self, keys):
+        held[0] = max(held[0], len(self.records))
+        records = fetch(self, keys)
+        if records:
+            batches.append(len(records))
+        return records
+    monkeypatch.setattr(Resolver, "fetch", spy)
+    return batches, held
+
+
+def test_stream_batches_references(client, fetches):
+    batches, held = fetches
+    models = list(Model.query(namespace="stream", client=client,
+                              stream=True))
+    assert len(models) == COUNT
+    assert [m.source.name for m in models] == \
+        ["d%d" % i for i in range(len(models))]
+    # one batch of references per window
+    assert batches == [DEFAULT_STREAM_WINDOW] * 3 + [8]
+    # only the records of a window and their references are held
+    assert held[0] <= 2 * DEFAULT_STREAM_WINDOW
+
+
+def test_stream_same_as_load(client):
+    streamed = Model.query(namespace="stream", client=client, stream=True)
+    loaded = Model.query(namespace="stream", client=client)
+    assert [m.to_dict() for m in streamed] == [m.to_dict() for m in loaded]
@@ -0,0 +1,45 @@
+"""UploadIndex skipping the upload of unchanged local files"""
+import pytest
+
+from registry.lazy import S3Artifact
+from registry.upload import UploadIndex
+
+
+@pytest.fixture
+def uploads():
+    uploaded = []
+
+    def upload(path):
+        uploaded.append(path)
+        return S3Artifact(key="upload/%d" % len(uploaded))
+    return uploaded, upload
+
+
+def test_unchanged_not_uploaded(tmp_path, monkeypatch, uploads):
+    uploaded, upload = uploads
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("a")
+    index = UploadIndex(str(tmp_path / "index.db"))
+    first = index.upload("a.txt", upload=upload)
+    assert index.upload(str(tmp_path / "a.txt"), upload=upload).key == \
+        first.key
+    assert len(uploaded) == 1
+    (tmp_path / "a.txt").write_text("b")
+    index.upload("a.txt", upload=upload)
+    assert len(uploaded) == 2
+
+
+def test_keyed_by_layout(tmp_path, monkeypatch, uploads):
+    uploaded, upload = uploads
+    (tmp_path / "data").mkdir()
+    path = tmp_path / "data" / "a.txt"
+    path.write_text("a")
+    index = UploadIndex(str(tmp_path / "index.db"))
+    monkeypatch.chdir(tmp_path)
+    index.upload(str(path), upload=upload)
+    # laid out as a.txt instead of data/a.txt within the artifact
+    monkeypatch.chdir(tmp_path / "data")
+    index.upload(str(path), upload=upload)
+    assert len(uploaded) == 2
+    index.upload("a.txt", upload=upload)
+    assert len(uploaded) == 2
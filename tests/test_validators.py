@@ -0,0 +1,58 @@
+"""Revalidation of query responses by conditional GETs against the local
+stand-in registry"""
+from registry.cache import ValidatorCache
+from registry.client import RegistryClient
+from registry.model import Workflow
+
+
+class EvictingValidatorCache(ValidatorCache):
+    """Validators evicted between sending the conditional request and
+    receiving its 304, as by concurrent queries"""
+
+    def response(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        return super().response(key)
+
+
+def query(client):
+    return Workflow.query(namespace="check", client=client)
+
+
+def insert(client, versions):
+    for version in versions:
+        Workflow("check", "w", version).insert(client=client)
+
+
+def test_not_modified_reused(registry_server):
+    client = RegistryClient(registry_server.url, validators=ValidatorCache())
+    insert(client, ["v0", "v1", "v2"])
+    first = query(client)
+    second = query(client)
+    assert registry_server.not_modified == 1
+    assert client.validators.stats["not_modified"] == 1
+    # the objects parsed from the stored response are reused
+    assert len(second) == 3
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_changes_seen(registry_server):
+    client = RegistryClient(registry_server.url, validators=ValidatorCache())
+    insert(client, ["v0", "v1", "v2"])
+    query(client)
+    insert(client, ["v3"])
+    assert len(query(client)) == 4
+    assert registry_server.not_modified == 0
+
+
+def test_evicted_while_revalidated(registry_server):
+    client = RegistryClient(registry_server.url,
+                            validators=EvictingValidatorCache())
+    insert(client, ["v0", "v1"])
+    query(client)
+    requests = registry_server.requests["GET"]
+    res = query(client)
+    assert registry_server.not_modified == 1
+    # made again without validators
+    assert registry_server.requests["GET"] == requests + 2
+    assert res is not None and len(res) == 2
@@ -0,0 +1,89 @@
+"""Request bodies sent compressed or in MessagePack to the local stand-in
+registry, and sent again as plain JSON only if not decoded"""
+import asyncio
+
+import pytest
+
+from registry.aio import AsyncRegistryClient
+from registry.client import RegistryClient
+from registry.model import Workflow
+from registry.wire import JSON, MSGPACK, WireFormat
+
+from fake_registry import FakeRegistry
+
+GZIP = ("gzip", JSON)
+PLAIN = (None, JSON)
+
+
+def gzip_client(server):
+    return RegistryClient(server.url,
+                          wire=WireFormat(compression="gzip", threshold=0))
+
+
+def insert(client, version):
+    w = Workflow("wire", "w", version)
+    w.insert(client=client)
+    return w.id
+
+
+@pytest.mark.parametrize("status", [415, 400])
+def test_undecoded_sent_plain(status):
+    with FakeRegistry(reject_encoded=status) as server:
+        client = gzip_client(server)
+        assert insert(client, "v1")
+        assert server.posted == [GZIP, PLAIN]
+        # the following bodies are sent as plain JSON
+        assert insert(client, "v2")
+        assert server.posted == [GZIP, PLAIN, PLAIN]
+        assert client.wire.compression is None
+
+
+def test_rejection_not_sent_again():
+    with FakeRegistry(unique=True) as server:
+        insert(RegistryClient(server.url), "v1")
+        server.posted.clear()
+        client = gzip_client(server)
+        # answered 400 with the code of the registry
+        assert insert(client, "v1") is None
+        assert insert(client, "v1") is None
+        assert server.posted == [GZIP, GZIP]
+        assert client.wire.compression == "gzip"
+
+
+def test_decoded_encoding_kept():
+    with FakeRegistry(unique=True) as server:
+        client = gzip_client(server)
+        assert insert(client, "v1")
+        # known to be decoded, a 400 without code is not about the encoding
+        server.reject_encoded = 400
+        assert insert(client, "v2") is None
+        assert server.posted == [GZIP, GZIP]
+        assert client.wire.compression == "gzip"
+
+
+def test_msgpack_sent_json():
+    pytest.importorskip("msgpack")
+    with FakeRegistry(reject_encoded=415) as server:
+        client = RegistryClient(server.url)
+        Workflow.query(namespace="wire", client=client)
+        assert client.wire.binary_accepted
+        assert insert(client, "v1")
+        assert server.posted == [(None, MSGPACK), PLAIN]
+        assert not client.wire.binary
+        assert insert(client, "v2")
+        assert server.posted[-1] == PLAIN
+
+
+def test_async_undecoded_sent_plain():
+    pytest.importorskip("aiohttp")
+
+    async def main(server):
+        wire = WireFormat(compression="gzip", threshold=0)
+        async with AsyncRegistryClient(server.url, wire=wire) as client:
+            w = Workflow("wire", "w", "v1")
+            await w.ainsert(client=client)
+            return w.id
+
+    with FakeRegistry(reject_encoded=415) as server:
+        assert asyncio.run(main(server))
+        assert server.posted == [GZIP, PLAIN]